@@ -1,7 +1,46 @@
-from sqlalchemy.orm import Session
-from fastapi import Depends
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, Request
+from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from pydantic import EmailStr
+from app.db.session import get_db, get_read_db
+from app.services.auth_service import get_current_user
+from app.services.role_service import TeamContext, get_team_context, get_user_role
+from app.services.rate_limit_service import check_rate_limit
 
 # Dependency to get the database session
-def get_database_session(db: Session = Depends(get_db)):
+async def get_database_session(db: AsyncSession = Depends(get_db)):
     return db
+
+# Dependency to get a read only database session, served by the replica when configured
+async def get_read_database_session(db: AsyncSession = Depends(get_read_db)):
+    return db
+
+# Dependency to get the team and the current user's membership of it in a single query
+async def get_current_team_context(team_id: int, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)) -> TeamContext:
+    return await get_team_context(current_user.id, team_id, db, request)
+
+# Dependency to get the current user's role and the team name, served from the role cache
+async def get_current_user_role(team_id: int, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+    return await get_user_role(current_user.id, team_id, db, request)
+
+# Identities the rate limits are applied to on top of the client ip
+def get_login_identity(user_credentials: OAuth2PasswordRequestForm = Depends()):
+    return user_credentials.username.lower()
+
+def get_email_identity(email: EmailStr):
+    return email.lower()
+
+def get_user_identity(current_user: int = Depends(get_current_user)):
+    return current_user.id
+
+def get_no_identity():
+    return None
+
+def rate_limit(route: str, identity=get_no_identity):
+    """ Dependency taking a token from the route's bucket of the client ip, and of the identity when there is one """
+    async def check(request: Request, identity_value = Depends(identity)):
+        identities = [f"ip:{request.client.host if request.client else 'unknown'}"]
+        if identity_value is not None:
+            identities.append(f"user:{identity_value}")
+        await check_rate_limit(route, identities)
+    return check
@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.api.v1.schemas.user import Token
-from sqlalchemy.orm import Session
-from app.api.v1.dependencies import get_database_session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.dependencies import get_database_session, rate_limit, get_login_identity
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 from app.db import models 
-from app.services.auth_service import verify_password, create_access_token
+from app.services.auth_service import create_access_token
+from app.services.hashing_service import verify_secret
 
 auth_router = APIRouter()
 
-@auth_router.post("/login", response_model=Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_database_session)):
+@auth_router.post("/login", response_model=Token, dependencies=[Depends(rate_limit("login", get_login_identity))])
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_database_session)):
     # Get the current user 
-    user = db.query(models.User).filter(models.User.email == user_credentials.username).first()
+    user = await db.scalar(select(models.User).where(models.User.email == user_credentials.username))
     # Check wheather the user is verified or not
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User Not verified")
@@ -19,7 +21,7 @@ def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session =
     if not user:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
     # Verify the password
-    if not verify_password(user_credentials.password, user.password):
+    if not await verify_secret(user_credentials.password, user.password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
 
     access_token = create_access_token(data={"user_id": user.id})
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from app.api.v1.dependencies import get_database_session
-from sqlalchemy.orm import Session
-from app.api.v1.schemas.source import CreateMinioBucket, DeleteMinioBucket
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
+from typing import Optional
+from app.api.v1.dependencies import get_database_session, get_read_database_session, get_current_user_role
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from app.api.v1.schemas.source import CreateMinioBucket, DeleteMinioBucket, BulkBucketRequestDecision
 from app.services.minio_service import (create_minio_bucket, 
         check_bucket_exist, delete_bucket, 
         list_all_buckets, create_bucket_request_temporilio,
         list_all_buckets_request_team, list_all_buckets_request_user,
-        approve_create_bucket, reject_create_bucket)
+        approve_create_bucket, reject_create_bucket, decide_bucket_requests)
 from app.casbin.enforcer import check_permission
 from app.services.auth_service import get_current_user
 from app.services.role_service import get_user_role
@@ -18,11 +20,11 @@ minio_router = APIRouter()
 
 # Create a bucket in minio
 @minio_router.post('/create_bucket')
-def create_bucket_minio(new_source: CreateMinioBucket, background_task: BackgroundTasks, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def create_bucket_minio(new_source: CreateMinioBucket, request: Request, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     bucket_name = new_source.bucket_name.lower().replace(' ', '')
 
    # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, new_source.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, new_source.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "read"):
@@ -33,21 +35,21 @@ def create_bucket_minio(new_source: CreateMinioBucket, background_task: Backgrou
         raise HTTPException(status_code=403, detail="User doesnt have permission to create new source")
     
     # Get the secret credentials from the vault
-    credentails = get_secret(f"{team_name}/minio_credentials")
+    credentails = await run_in_threadpool(get_secret, f"{team_name}/minio_credentials")
     
     # If the bucket exist raise a http exception
-    if check_bucket_exist(bucket_name, json.loads(credentails)):
+    if await run_in_threadpool(check_bucket_exist, bucket_name, json.loads(credentails)):
         raise HTTPException(status_code=403, detail="Bucket already exits!")
     
-    background_task.add_task(create_minio_bucket, new_source.team_id, bucket_name, json.loads(credentails), db)
+    background_task.add_task(create_minio_bucket, new_source.team_id, bucket_name, json.loads(credentails))
     return {"message": f"new bucket created with name {bucket_name}"}
 
 @minio_router.delete('/delete_bucket')
-def delete_bucket_minio(new_source: DeleteMinioBucket, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def delete_bucket_minio(new_source: DeleteMinioBucket, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     bucket_name = new_source.bucket_name.lower().replace(' ', '')
 
    # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, new_source.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, new_source.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "read"):
@@ -58,20 +60,20 @@ def delete_bucket_minio(new_source: DeleteMinioBucket, db: Session = Depends(get
         raise HTTPException(status_code=403, detail="User doesnt have permission to delete a resource")
     
     # Get the secret credentials from the vault
-    credentails = get_secret(f"{team_name}/minio_credentials")
+    credentails = await run_in_threadpool(get_secret, f"{team_name}/minio_credentials")
     
     # If the bucket exist raise a http exception
-    if not check_bucket_exist(bucket_name, json.loads(credentails)):
+    if not await run_in_threadpool(check_bucket_exist, bucket_name, json.loads(credentails)):
         raise HTTPException(status_code=403, detail="Bucket doesnt exit!")
 
     # create a new bucket 
-    delete_bucket(bucket_name, json.loads(credentails))
+    await run_in_threadpool(delete_bucket, bucket_name, json.loads(credentails))
     return {"message": f"bucket deleted with the name : {bucket_name}"}
 
 @minio_router.get("/list_buckets")
-def list_buckets_minio(team_id: int, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def list_buckets_minio(team_id: int, current_user: int = Depends(get_current_user), current_user_role: tuple = Depends(get_current_user_role)):
    # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, team_id, db)
+    user_role, team_name = current_user_role
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "read"):
@@ -82,19 +84,19 @@ def list_buckets_minio(team_id: int, db: Session = Depends(get_database_session)
         raise HTTPException(status_code=403, detail="User doesnt have permission to get resources")
     
     # Get the secret credentials from the vault
-    credentails = get_secret(f"{team_name}/minio_credentials")
+    credentails = await run_in_threadpool(get_secret, f"{team_name}/minio_credentials")
 
     # Get all the buckets from minio
-    buckets = list_all_buckets(json.loads(credentails))
+    buckets = await run_in_threadpool(list_all_buckets, json.loads(credentails))
 
     return buckets
     
 @minio_router.post('/request/create_bucket')
-async def create_new_bucket_request(new_source: CreateMinioBucket, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def create_new_bucket_request(new_source: CreateMinioBucket, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     bucket_name = new_source.bucket_name.lower().replace(' ', '')
 
    # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, new_source.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, new_source.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "read"):
@@ -105,17 +107,24 @@ async def create_new_bucket_request(new_source: CreateMinioBucket, db: Session =
         raise HTTPException(status_code=403, detail="User doesnt have permission to create new source")
 
     # Create a request for bucket creation in temporilio
-    workflow_id = await create_bucket_request_temporilio(current_user.id, new_source.team_id, bucket_name, team_name)
+    workflow_id = await create_bucket_request_temporilio(current_user.id, new_source.team_id, bucket_name, team_name, db)
     return workflow_id
 
 @minio_router.get("/request/create_bucket/pending_requests")
-async def list_pending_buckets(team_id: int, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def list_pending_buckets(
+    team_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_database_session),
+    current_user: int = Depends(get_current_user),
+    current_user_role: tuple = Depends(get_current_user_role)
+):
     # Get the team name and user role 
-    user_role, _ = get_user_role(current_user.id, team_id, db)
+    user_role, _ = current_user_role
 
     # If the user is admin return all the bucket requests
     if check_permission(user_role, "source_minio", "list_all_requests"):
-        all_buckets_requests = await list_all_buckets_request_team(team_id)
+        all_buckets_requests = await list_all_buckets_request_team(team_id, db, limit, before)
         return all_buckets_requests
 
     # If the user is not a editor/admin he is not allowed to fetch requests.
@@ -123,38 +132,56 @@ async def list_pending_buckets(team_id: int, db: Session = Depends(get_database_
         raise HTTPException(status_code=403, detail="User not allowed to fetch requests!")
     
     # If the user is editor return all the request they made
-    user_bucket_requests = await list_all_buckets_request_user(current_user.id, team_id)
+    user_bucket_requests = await list_all_buckets_request_user(current_user.id, team_id, db, limit, before)
 
     return user_bucket_requests
 
 @minio_router.post("/request/create_bucket/pending_requests/approve_bucket_creation")
-async def approve_bucket_creation(workflow_id: str, team_id: int, background_task: BackgroundTasks, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def approve_bucket_creation(workflow_id: str, team_id: int, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user), current_user_role: tuple = Depends(get_current_user_role)):
     # Get the team name and user role 
-    user_role, _ = get_user_role(current_user.id, team_id, db)
+    user_role, _ = current_user_role
 
     # Check the user is admin of the team or not
     if not check_permission(user_role, "source_minio", "approve_request"):
         raise HTTPException(status_code=403, detail="User does not have permission to approve a request")
     
-    user_id, bucket_name = await approve_create_bucket(workflow_id)
+    user_id, bucket_name = await approve_create_bucket(workflow_id, team_id, db)
 
-    background_task.add_task(start_app_notifications_workflow, [{"user_id": user_id}], f"Your request for bucket creation for bucket name : {bucket_name} has approved!", db)
+    background_task.add_task(start_app_notifications_workflow, [{"user_id": user_id}], f"Your request for bucket creation for bucket name : {bucket_name} has approved!")
 
     return {"message": "Bucket creation request approved!"}
 
 @minio_router.post("/request/create_bucket/pending_requests/reject_bucket_creation")
-async def reject_bucket_creation(workflow_id: str, team_id: int, background_task: BackgroundTasks, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def reject_bucket_creation(workflow_id: str, team_id: int, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user), current_user_role: tuple = Depends(get_current_user_role)):
     # Get the team name and user role 
-    user_role, _ = get_user_role(current_user.id, team_id, db)
+    user_role, _ = current_user_role
 
     # Check the user is admin of the team or not
     if not check_permission(user_role, "source_minio", "reject_request"):
         raise HTTPException(status_code=403, detail="User does not have permission to reject a request")
     
     # Approve bucket creation request if the user is admin
-    user_id, bucket_name = await reject_create_bucket(workflow_id)
+    user_id, bucket_name = await reject_create_bucket(workflow_id, team_id, db)
 
     # Send notification to the user 
-    background_task.add_task(start_app_notifications_workflow, [{"user_id": user_id}], f"Your request for bucket creation for bucket name : {bucket_name} has rejected!", db)
+    background_task.add_task(start_app_notifications_workflow, [{"user_id": user_id}], f"Your request for bucket creation for bucket name : {bucket_name} has rejected!")
 
     return {"message": "Bucket creation request rejected!"}
+
+@minio_router.post("/request/create_bucket/pending_requests/bulk_decision")
+async def bulk_bucket_creation_decision(decision: BulkBucketRequestDecision, team_id: int, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user), current_user_role: tuple = Depends(get_current_user_role)):
+    # Get the team name and user role 
+    user_role, _ = current_user_role
+
+    # Check the user is admin of the team or not
+    if not check_permission(user_role, "source_minio", "approve_request" if decision.approved else "reject_request"):
+        raise HTTPException(status_code=403, detail=f"User does not have permission to {'approve' if decision.approved else 'reject'} a request")
+
+    # Approve or reject all the pending requests
+    outcomes, bucket_names_by_user = await decide_bucket_requests(decision.workflow_ids, team_id, decision.approved, db)
+
+    # Send a single notification to each user for all of their requests
+    for user_id, bucket_names in bucket_names_by_user.items():
+        background_task.add_task(start_app_notifications_workflow, [{"user_id": user_id}], f"Your request for bucket creation for bucket names : {', '.join(bucket_names)} has {'approved' if decision.approved else 'rejected'}!")
+
+    return {"results": [{"workflow_id": workflow_id, "outcome": outcome} for workflow_id, outcome in outcomes.items()]}
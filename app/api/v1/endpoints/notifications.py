@@ -1,10 +1,17 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from app.services.notification_service import get_token_from_websocket, redis_client
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.services.notification_service import (
+    get_token_from_websocket,
+    fetch_notifications_page, build_notifications_page, stream_notifications)
+from app.services.notification_hub import notification_hub, SlowConsumer
+from app.api.v1.schemas.notification import NotificationPage
+from typing import Literal, Optional
 from app.services.auth_service import get_current_user
-from sqlalchemy.orm import Session
-from app.api.v1.dependencies import get_database_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.dependencies import get_database_session, get_read_database_session, get_current_team_context
+from app.services.role_service import TeamContext
 from app.db import models
-from sqlalchemy import or_
+from sqlalchemy import select
 
 notification_router = APIRouter()
 
@@ -13,19 +20,19 @@ async def send_notification_to_user(
     websocket: WebSocket, 
     topic: str, 
     topic_id: str,
-    db: Session = Depends(get_database_session)
+    db: AsyncSession = Depends(get_database_session)
 ):
     try:
         # Get token and verify user before accepting connection
         token = await get_token_from_websocket(websocket)
-        current_user = get_current_user(token=token, db=db)
+        current_user = await get_current_user(token=token, db=db)
 
         if topic == "teams":
             # Check if the user is a member of the team
-            is_member = db.query(models.Membership).filter(
+            is_member = await db.scalar(select(models.Membership).where(
                 models.Membership.user_id == current_user.id,
                 models.Membership.team_id == topic_id
-            ).first()
+            ))
 
             # Raising forbidden if the user is not part the team
             if not is_member:
@@ -33,28 +40,28 @@ async def send_notification_to_user(
             
         if topic == "users":
             # Check if the user exist in the database
-            user = db.query(models.User).filter(models.User.id == topic_id).first()
+            user = await db.scalar(select(models.User).where(models.User.id == topic_id))
 
             # Rasing forbidden if the user is not found
             if not user:
                 raise HTTPException(status_code=403, detail="User not found")
         
-        await websocket.accept()
-        # Subscribe to redis pub/sub service
-        pubsub = redis_client.pubsub()
-        await pubsub.subscribe(topic_id)
+        # Release the database connection before holding the websocket open
+        await db.close()
 
-        # Listen for messages from Redis and send them to the WebSocket
-        try:
-            async for message in pubsub.listen():
-                if message["type"] == "message":
-                    await websocket.send_text(message["data"])
-        except WebSocketDisconnect:
-            print(f"WebSocket disconnected for {topic_id}")
-        finally:
-            await pubsub.unsubscribe(topic_id)
-            await pubsub.close()
-            await websocket.close()
+        await websocket.accept()
+        # Listen on the redis subscription shared by every websocket of this process
+        async with notification_hub.subscribe(topic_id) as messages:
+            # Send the messages from Redis to the WebSocket, slow clients are disconnected
+            close_code, close_reason = 1000, None
+            try:
+                await notification_hub.send_messages(messages, websocket.send_text)
+            except SlowConsumer as e:
+                close_code, close_reason = 4002, str(e)
+            except WebSocketDisconnect:
+                print(f"WebSocket disconnected for {topic_id}")
+            finally:
+                await websocket.close(code=close_code, reason=close_reason)
 
     except HTTPException as he:
         await websocket.close(code=4001, reason=str(he.detail))
@@ -63,25 +70,28 @@ async def send_notification_to_user(
         await websocket.close(code=4000)
         raise HTTPException(status_code=403, detail="Credentials not found or invalid")
     
-@notification_router.get('/get_all_notifications/{team_id}')
-def get_all_notifications(team_id: int, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
-    # Check wheather the team exist or not
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="team does not exist")
-    
+@notification_router.get('/get_all_notifications/{team_id}', response_model=NotificationPage)
+async def get_all_notifications(
+    team_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    db: AsyncSession = Depends(get_read_database_session),
+    current_user: int = Depends(get_current_user),
+    team_context: TeamContext = Depends(get_current_team_context)
+):
     # Check if the user is a member of the team
-    is_member = db.query(models.Membership).filter(
-        models.Membership.user_id == current_user.id,
-        models.Membership.team_id == team_id
-    ).first()
-
-    if not is_member:
+    if not team_context.membership:
         raise HTTPException(status_code=403, detail="User doesnt have access to view team notifications")
-    
-    return db.query(models.Notifications).filter(
-        or_(
-            models.Notifications.user_id == current_user.id,
-            models.Notifications.team_id == team_id
-        )
-    ).all()
+
+    if before and after:
+        raise HTTPException(status_code=400, detail="Only one of before and after can be used")
+
+    # Export the whole history as newline delimited json
+    if format == "ndjson":
+        return StreamingResponse(stream_notifications(current_user.id, team_id), media_type="application/x-ndjson")
+
+    # Get a single page of notifications using the cursor
+    rows = await fetch_notifications_page(db, current_user.id, team_id, limit, before=before, after=after)
+    return build_notifications_page(rows, limit, before=before, after=after)
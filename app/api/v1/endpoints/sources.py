@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.casbin.enforcer import check_permission
 from app.api.v1.dependencies import get_database_session
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
 from app.services.auth_service import get_current_user
 from app.api.v1.schemas.source import (
     AddMinioCredentials, DeleteMinioCredentials, UpdateMinioCredentials)
@@ -13,9 +14,9 @@ minio_router = APIRouter()
 
 # Add new minio client credentials
 @minio_router.post('/add_minio_client_credentials')
-def add_minio_client_credentials_to_vault(minio_credentials: AddMinioCredentials, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def add_minio_client_credentials_to_vault(minio_credentials: AddMinioCredentials, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, minio_credentials.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, minio_credentials.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "write"):
@@ -28,26 +29,26 @@ def add_minio_client_credentials_to_vault(minio_credentials: AddMinioCredentials
                             "minio_server": minio_credentials.minio_server}
     
     # Add the secrets to key vault
-    response = create_secret(minio_credentials_dict)
+    response = await run_in_threadpool(create_secret, minio_credentials_dict)
     return response
 
 @minio_router.delete('/delete_minio_client_credentials')
-def delete_minio_client_credentials(delete_credentials: DeleteMinioCredentials, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def delete_minio_client_credentials(delete_credentials: DeleteMinioCredentials, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, delete_credentials.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, delete_credentials.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "delete"):
         raise HTTPException(status_code=403, detail="User doesnt have permission to add new source")
     
     # Delete secret from vault
-    delete_secret(f"{team_name}/minio_credentials")
+    await run_in_threadpool(delete_secret, f"{team_name}/minio_credentials")
     return {"message": "secrets deleted successfully"}
 
 @minio_router.put('/update_minio_client_credentials')
-def update_minio_client_credentials(update_credentials: UpdateMinioCredentials, db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def update_minio_client_credentials(update_credentials: UpdateMinioCredentials, request: Request, db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     # Get the team name and user role 
-    user_role, team_name = get_user_role(current_user.id, update_credentials.team_id, db)
+    user_role, team_name = await get_user_role(current_user.id, update_credentials.team_id, db, request)
 
     # Check the permission of the user
     if not check_permission(user_role, "vault", "delete"):
@@ -60,5 +61,5 @@ def update_minio_client_credentials(update_credentials: UpdateMinioCredentials,
                             "minio_server": update_credentials.minio_server}
 
     # Update secret from vault
-    response = update_secret(minio_credentials_dict)
+    response = await run_in_threadpool(update_secret, minio_credentials_dict)
     return response
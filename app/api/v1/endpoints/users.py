@@ -1,83 +1,74 @@
-import os
 from fastapi import status, Depends, APIRouter, BackgroundTasks
-from sqlalchemy import delete
+from sqlalchemy import delete, select
 from app.api.v1.schemas.user import UserCreate, UserResponse, UserDelete
-from sqlalchemy.orm import Session
-from app.api.v1.dependencies import get_database_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.dependencies import get_database_session, rate_limit, get_email_identity
 from app.db import models
-from app.services.user_service import hash_password, create_new_otp, validate_otp
-from app.services.auth_service import get_current_user, create_url_safe_token, decode_url_safe_token, verify_password
+from app.services.user_service import create_new_otp, validate_otp
+from app.services.hashing_service import hash_secret, verify_secret
+from app.services.auth_service import get_current_user, create_url_safe_token, decode_url_safe_token, invalidate_user_principals
 from app.services.mail.mail_service import start_email_workflow
+from app.services.mail.template_service import render_email_async
 from fastapi import HTTPException
 from app.core.config import get_settings
-from fastapi.templating import Jinja2Templates
 from datetime import datetime, timedelta
 from pydantic import EmailStr
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Path where the template folder resides
-template_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))), 'services', 'mail', 'templates')
-
-templates = Jinja2Templates(directory=template_dir)
-
 user_router = APIRouter()
 
 @user_router.post('/', status_code=status.HTTP_201_CREATED, response_model=UserResponse)
-async def create_user(user: UserCreate, background_task: BackgroundTasks, db: Session = Depends(get_database_session)):
+async def create_user(user: UserCreate, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session)):
     # Check wheather the user email exist in the database or not.
-    user_exist = db.query(models.User).filter(models.User.email == user.email).first()
+    user_exist = await db.scalar(select(models.User).where(models.User.email == user.email))
     if user_exist:
         raise HTTPException(status_code=400, detail="Email already exist")
     # Convert the password into hashpassword
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_secret(user.password)
     user.password = hashed_password
     new_user = models.User(**user.dict(), updated_at=datetime.utcnow())
     token = create_url_safe_token({"email": user.email, "created_at": datetime.utcnow().timestamp()})
     verification_link = f"http://{get_settings().DOMAIN}/v1/users/verify/{token}"
     # Render Jinja2 email template
-    html_content = templates.TemplateResponse(
-        "verification_mail.html",
-        {"request": None, "verification_link": verification_link}
-    ).body.decode("utf-8")  # Convert from bytes to string
+    html_content = await render_email_async("verification_mail.html", {"verification_link": verification_link})
 
     # Once all the details are satisfied then insert the database into database
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     # Temporlio workflow to send verification mail to the user
     background_task.add_task(start_email_workflow, user.email, "Verify your Email", html_content)
     return UserResponse(email=user.email, name=user.name, created_at=datetime.utcnow(), message="Please check your email for the verification link.")
 
 @user_router.delete('/delete_user', status_code=status.HTTP_200_OK, response_model=UserDelete)
-async def delete_user(db: Session = Depends(get_database_session), current_user: int = Depends(get_current_user)):
+async def delete_user(db: AsyncSession = Depends(get_database_session), current_user: int = Depends(get_current_user)):
     # Get the current user 
-    user = db.query(models.User).filter(models.User.email == current_user.email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == current_user.email))
 
     # Check wheather its a valid user or not
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await invalidate_user_principals(user.id)
     return user
 
-@user_router.post('/forget_password', status_code=status.HTTP_200_OK)
-def forget_password(email: EmailStr, background_task: BackgroundTasks, db: Session = Depends(get_database_session)):
+@user_router.post('/forget_password', status_code=status.HTTP_200_OK, dependencies=[Depends(rate_limit("forget_password", get_email_identity))])
+async def forget_password(email: EmailStr, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session)):
     # Get the current user
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == email))
 
     # Check wheather its a valid user or not
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Create otp and add the otp to the database 
-    created_otp = create_new_otp(db, user.id)
+    created_otp = await create_new_otp(db, user.id)
 
-    html_content = templates.TemplateResponse(
+    html_content = await render_email_async(
         "forget_password_mail.html",
-        {"request": None, "username": email.split("@")[0], 
-        "user_email": email, "otp_code": created_otp}
-    ).body.decode("utf-8")
+        {"username": email.split("@")[0], "user_email": email, "otp_code": created_otp}
+    )
 
     # Send the otp through mail to the user 
     background_task.add_task(start_email_workflow, email, "Password reset mail", html_content)
@@ -85,16 +76,16 @@ def forget_password(email: EmailStr, background_task: BackgroundTasks, db: Sessi
     ##TODO this will be changed to frontend url redirect page 
     return {"message": "Please verify your email for the otp"}
 
-@user_router.post('/verify_otp', status_code=status.HTTP_200_OK)
-def verify_otp(email: EmailStr, otp: str, db: Session = Depends(get_database_session)):
-    user = db.query(models.User).filter(models.User.email == email).first()
+@user_router.post('/verify_otp', status_code=status.HTTP_200_OK, dependencies=[Depends(rate_limit("verify_otp", get_email_identity))])
+async def verify_otp(email: EmailStr, otp: str, db: AsyncSession = Depends(get_database_session)):
+    user = await db.scalar(select(models.User).where(models.User.email == email))
 
     # Check wheather the user is valid user or not
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Check wheather the otp is invalid or not 
-    result = validate_otp(db, user.id, otp)
+    result = await validate_otp(db, user.id, otp)
 
     # Return the error occured
     if "error" in result:
@@ -103,19 +94,19 @@ def verify_otp(email: EmailStr, otp: str, db: Session = Depends(get_database_ses
     ###TODO Here instead of this route it to a frontend page.
     return {"message": "OTP verified successfully!"}
 
-@user_router.post('/reset_password', status_code=status.HTTP_200_OK)
-def reset_password(email: EmailStr, otp: str, new_password: str, db: Session = Depends(get_database_session)):
-    user = db.query(models.User).filter(models.User.email == email).first()
+@user_router.post('/reset_password', status_code=status.HTTP_200_OK, dependencies=[Depends(rate_limit("verify_otp", get_email_identity))])
+async def reset_password(email: EmailStr, otp: str, new_password: str, db: AsyncSession = Depends(get_database_session)):
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     # Check wheather the user is valid user or not
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # Check wheather the otp is valid or not
-    result = validate_otp(db, user.id, otp)
+    result = await validate_otp(db, user.id, otp)
     # Return the error occured
     if "error" in result:
         raise HTTPException(status_code=404, detail=result['error'])
     # Check wheather the user is trying to set the old password as new password
-    if verify_password(new_password, user.password):
+    if await verify_secret(new_password, user.password):
         raise HTTPException(status_code=400, 
             detail="New password cannot be same as the old password")
     
@@ -124,22 +115,23 @@ def reset_password(email: EmailStr, otp: str, new_password: str, db: Session = D
         # Mark OTP as used BEFORE updating password
         valid_otp.used_at = datetime.utcnow()
         valid_otp.is_valid = False
-        db.commit()
+        await db.commit()
         # Update password
-        user.password = hash_password(new_password)
-        db.commit()
-        db.refresh(user)
+        user.password = await hash_secret(new_password)
+        await db.commit()
+        await db.refresh(user)
+        await invalidate_user_principals(user.id)
         ### TODO route this to frontend on successfully request 
         return {"message": "Password reset successful"}
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred"
         )
 
 @user_router.get('/verify/{token}')
-async def verify_user_account(token: str, background_task: BackgroundTasks, db: Session = Depends(get_database_session)):
+async def verify_user_account(token: str, background_task: BackgroundTasks, db: AsyncSession = Depends(get_database_session)):
     # Decode the token 
     token = decode_url_safe_token(token)
     # Extract the user email and the timestamp
@@ -153,7 +145,7 @@ async def verify_user_account(token: str, background_task: BackgroundTasks, db:
     # Check wheather the token is valid or not
     if not user_email or not timestamp:
         raise HTTPException(status_code=403, detail="Invalid token!")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == user_email))
     if not user:
         raise HTTPException(status_code=403, detail="User not found!")
     if user.is_active:
@@ -163,12 +155,12 @@ async def verify_user_account(token: str, background_task: BackgroundTasks, db:
     user.updated_at = datetime.utcnow()
     user.verified_at = datetime.utcnow()
     # Add the updated user details to the database
-    db.commit()
-    db.refresh(user)
-    html_content = templates.TemplateResponse(
+    await db.commit()
+    await db.refresh(user)
+    html_content = await render_email_async(
         "welcome_mail.html",
-        {"request": None, "username": user_email.split("@")[0], "user_email": user_email}
-    ).body.decode("utf-8")  # Convert from bytes to string
+        {"username": user_email.split("@")[0], "user_email": user_email}
+    )
     background_task.add_task(start_email_workflow, user_email, "Welcome to the platform!", html_content)
 
     ##TODO this will be changed to frontend url redirect page 
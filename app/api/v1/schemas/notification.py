@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class NotificationResponse(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    team_id: Optional[int] = None
+    message: str
+    created_at: Optional[datetime] = None
+
+class NotificationPage(BaseModel):
+    notifications: List[NotificationResponse]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List
 
 class AddMinioCredentials(BaseModel):
     team_id: int
@@ -17,4 +18,8 @@ class DeleteMinioCredentials(BaseModel):
     team_id: int
 
 class UpdateMinioCredentials(AddMinioCredentials):
-    pass
\ No newline at end of file
+    pass
+
+class BulkBucketRequestDecision(BaseModel):
+    workflow_ids: List[str]
+    approved: bool
@@ -27,5 +27,13 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     id : Optional[str] = None
 
+class CurrentUser(BaseModel):
+    id: int
+    name: Optional[str] = None
+    email: str
+    is_active: Optional[bool] = None
+    class Config:
+        from_attributes = True
+
 class SendEmail(BaseModel):
     addresses: List[EmailStr]
\ No newline at end of file
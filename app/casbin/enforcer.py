@@ -1,15 +1,8 @@
 import casbin
 import casbin_sqlalchemy_adapter
-from sqlalchemy import create_engine
-from app.core.config import get_settings, Config
+from app.db.session import engine
 
-# Create the database url
-DATABASE_URL = Config.DB_CONFIG.format(get_settings().DATABASE_NAME)
-
-# Create the sqlalchemy engine
-engine = create_engine(DATABASE_URL, echo=True)
-
-# Initialize Casbin Enforcer with SQLAlchemy adapter for policy storage
+# Initialize Casbin Enforcer with SQLAlchemy adapter for policy storage, sharing the application engine
 adapter = casbin_sqlalchemy_adapter.Adapter(engine)
 enforcer = casbin.Enforcer("app/casbin/rbac_models.conf", adapter)
 
@@ -1,10 +1,21 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Optional
 
 
 # All the env values are stored into this settings.
 class Settings(BaseSettings):
-    DATABASE_NAME: str
+    DATABASE_NAME: str = "ai_platform_backend"
+    # Full database url, when empty a sqlite database named DATABASE_NAME is used
+    DATABASE_URL: Optional[str] = None
+    # Optional replica url used for read only queries
+    DATABASE_READ_REPLICA_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_ECHO: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
     TEMPORAL_URL: str
     SECRET_KEY: str
     ALGORITHM: str
@@ -23,6 +34,76 @@ class Settings(BaseSettings):
     REDIS_HOST: str
     REDIS_PORT: int
     VAULT_SERVER: str
+    # Membership role cache, the local ttl bounds how long other processes can serve a stale role
+    ROLE_CACHE_TTL_SECONDS: int = 300
+    ROLE_CACHE_LOCAL_TTL_SECONDS: int = 5
+    ROLE_CACHE_LOCAL_MAXSIZE: int = 10000
+    # Authenticated principal cache keyed by the token hash
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_LOCAL_TTL_SECONDS: int = 10
+    PRINCIPAL_CACHE_LOCAL_MAXSIZE: int = 10000
+    # Notifications older than the retention period are moved to the archive table
+    NOTIFICATION_RETENTION_DAYS: int = 90
+    NOTIFICATION_ARCHIVE_BATCH_SIZE: int = 5000
+    NOTIFICATION_ARCHIVE_MAX_BATCHES: int = 20
+    NOTIFICATION_RETENTION_CRON: str = "0 3 * * *"
+    # "workflow" delivers notifications through temporal, "direct" publishes to redis and only falls back to temporal
+    NOTIFICATION_DISPATCH_MODE: str = "workflow"
+    # Topics published per notification activity, and how many of those activities run at once
+    NOTIFICATION_FANOUT_CHUNK_SIZE: int = 100
+    NOTIFICATION_FANOUT_CONCURRENCY: int = 10
+    # Expired or used otps and unaccepted invitations are deleted by the cleanup workflow
+    INVITATION_EXPIRY_DAYS: int = 7
+    CLEANUP_BATCH_SIZE: int = 5000
+    CLEANUP_MAX_BATCHES: int = 20
+    CLEANUP_CRON: str = "0 * * * *"
+    # Limits of the bulk invitation endpoints, workflows are kept well under the temporal payload limit
+    INVITE_MAX_EMAILS: int = 10000
+    INVITE_MAX_UPLOAD_BYTES: int = 5_000_000
+    # Compiled email templates are cached here, defaults to jinja's private per user directory in the temp dir
+    EMAIL_TEMPLATE_CACHE_DIR: Optional[str] = None
+    # Batches of at least this many emails are rendered in a process pool, 0 processes keeps rendering in threads
+    EMAIL_RENDER_PROCESS_THRESHOLD: int = 500
+    EMAIL_RENDER_PROCESSES: int = 2
+    # Bcrypt runs on a "thread" or "process" pool, calls beyond the workers plus the queue are rejected with a 503
+    HASHING_EXECUTOR: str = "thread"
+    HASHING_WORKERS: int = 4
+    HASHING_MAX_QUEUE: int = 64
+    # Key of the otp hmac, derived from SECRET_KEY when not set
+    OTP_HMAC_SECRET: Optional[str] = None
+    # Token bucket limits per client ip and per user, written as requests/second, minute, hour or day
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_LOGIN: str = "10/minute"
+    RATE_LIMIT_FORGET_PASSWORD: str = "5/hour"
+    RATE_LIMIT_VERIFY_OTP: str = "10/minute"
+    RATE_LIMIT_INVITE: str = "20/minute"
+    EMAIL_WORKFLOW_MAX_RECIPIENTS: int = 2000
+    # Emails sent per activity over one smtp connection, activities run at once, and smtp connections kept open per worker
+    EMAIL_BATCH_SIZE: int = 100
+    EMAIL_CONCURRENCY: int = 4
+    EMAIL_SMTP_POOL_SIZE: int = 4
+    # Per task queue limits of each worker process, sync activities run on a pool of ACTIVITY_THREADS threads
+    NOTIFICATION_WORKER_MAX_ACTIVITIES: int = 100
+    NOTIFICATION_WORKER_MAX_WORKFLOW_TASKS: int = 100
+    NOTIFICATION_WORKER_ACTIVITY_THREADS: int = 4
+    EMAIL_WORKER_MAX_ACTIVITIES: int = 8
+    EMAIL_WORKER_MAX_WORKFLOW_TASKS: int = 50
+    EMAIL_WORKER_ACTIVITY_THREADS: int = 4
+    BUCKET_WORKER_MAX_ACTIVITIES: int = 10
+    BUCKET_WORKER_MAX_WORKFLOW_TASKS: int = 50
+    BUCKET_WORKER_ACTIVITY_THREADS: int = 10
+    MAINTENANCE_WORKER_MAX_ACTIVITIES: int = 2
+    MAINTENANCE_WORKER_MAX_WORKFLOW_TASKS: int = 10
+    MAINTENANCE_WORKER_ACTIVITY_THREADS: int = 2
+    # Largest bulk approval or rejection of bucket requests, and how many workflows are signalled at once
+    BUCKET_REQUEST_BULK_MAX_IDS: int = 500
+    BUCKET_REQUEST_BULK_CONCURRENCY: int = 10
+    # Messages buffered per websocket, and what happens when a slow client fills its buffer:
+    # "drop_oldest" drops the oldest message, "coalesce" keeps only the newest one, "disconnect" closes the websocket
+    WEBSOCKET_SEND_QUEUE_SIZE: int = 100
+    WEBSOCKET_OVERFLOW_POLICY: str = "drop_oldest"
+    WEBSOCKET_WRITE_TIMEOUT_SECONDS: float = 5.0
     
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -0,0 +1,20 @@
+"""
+Records the bucket requests whose workflows were started before the bucket_requests table existed
+(migration 4675bfc6398c), so they show up in the pending requests and can be approved or rejected.
+Safe to run more than once, requests which already have a row are skipped.
+
+    python -m app.db.backfill_bucket_requests
+"""
+import argparse
+import asyncio
+from app.db.session import AsyncSessionLocal
+from app.services.minio_service import backfill_bucket_requests
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        added = await backfill_bucket_requests(db)
+    print(f"Added {added} bucket requests")
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    asyncio.run(main())
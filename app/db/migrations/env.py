@@ -4,18 +4,14 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from app.db.models import Base
 from alembic import context
-from app.core.config import Config, get_settings
+from app.db.session import DATABASE_URL
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
-# Dynamically configure the database URL for SQLite
-config.set_main_option(
-    "sqlalchemy.url",
-    Config.DB_CONFIG.format(get_settings().DATABASE_NAME)
-    # SQLite uses the path to the database file, no username/password/hostname required
-)
+# Dynamically configure the database URL from the application settings
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
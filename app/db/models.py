@@ -1,5 +1,5 @@
 from app.db.session import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Boolean, DateTime, Index
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import text
@@ -13,6 +13,15 @@ class Role(str, enum.Enum):
     VIEWER = "viewer"
     EDITOR = "editor"
 
+# Enum for the state of a bucket creation request
+class BucketRequestStatus(str, enum.Enum):
+    PENDING = "pending"
+    APPROVED = "approved"
+    REJECTED = "rejected"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -41,6 +50,9 @@ class Team(Base):
 
 class Membership(Base):
     __tablename__ = "memberships"
+    __table_args__ = (
+        Index("ix_memberships_user_id_team_id", "user_id", "team_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -52,15 +64,24 @@ class Membership(Base):
 
 class Invitations(Base):
     __tablename__ = "invitations"
+    __table_args__ = (
+        Index("ix_invitations_team_id_invited_user_email", "team_id", "invited_user_email", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
     invited_user_email = Column(String, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
 
     team = relationship("Team", back_populates="invitations")
 
 class Notifications(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_team_id_created_at", "team_id", "created_at"),
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+        Index("ix_notifications_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -71,8 +92,22 @@ class Notifications(Base):
     user = relationship("User", back_populates="notifications")
     team = relationship("Team", back_populates="notifications")
 
+# Notifications moved out of the hot table by the retention workflow
+class NotificationsArchive(Base):
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=True)
+    team_id = Column(Integer, nullable=True)
+    message = Column(String, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=True, index=True)
+    archived_at = Column(TIMESTAMP, server_default=func.now())
+
 class PasswordResetOTP(Base):
     __tablename__ = "password_reset_opts"
+    __table_args__ = (
+        Index("ix_password_reset_opts_user_id_is_valid_expires_at", "user_id", "is_valid", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -84,4 +119,22 @@ class PasswordResetOTP(Base):
     attempts = Column(Integer, default=0)
     max_attempts = 5
 
-    user = relationship("User", back_populates="otps")
\ No newline at end of file
+    user = relationship("User", back_populates="otps")
+
+# Bucket creation requests mirrored from their temporal workflows, so listing them is a local indexed read
+class BucketRequest(Base):
+    __tablename__ = "bucket_requests"
+    __table_args__ = (
+        Index("ix_bucket_requests_team_id_status", "team_id", "status"),
+        Index("ix_bucket_requests_user_id_team_id", "user_id", "team_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    workflow_id = Column(String, nullable=False, unique=True)
+    run_id = Column(String, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    bucket_name = Column(String, nullable=False)
+    status = Column(Enum(BucketRequestStatus), default=BucketRequestStatus.PENDING, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(DateTime, nullable=True, default=None, onupdate=datetime.utcnow)
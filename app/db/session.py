@@ -1,13 +1,81 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url, Engine, URL
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings, Config
 
-# Database URL (SQLite in this case)
-DATABASE_URL = Config.DB_CONFIG.format(get_settings().DATABASE_NAME)
+settings = get_settings()
 
-# Create an engine for the database connection
-engine = create_engine(DATABASE_URL, echo=True)
+# Database URL, falls back to a local sqlite database when no url is configured
+DATABASE_URL = settings.DATABASE_URL or Config.DB_CONFIG.format(settings.DATABASE_NAME)
+
+# Async drivers used for each of the supported sync dialects
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def get_async_database_url(database_url: str) -> URL:
+    """ Convert a sync database url into the url of its async driver """
+    url = make_url(database_url)
+    async_driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if async_driver is None:
+        return url
+    return url.set(drivername=async_driver)
+
+def is_sqlite(database_url: str) -> bool:
+    return make_url(database_url).get_backend_name() == "sqlite"
+
+def get_engine_options(database_url: str) -> dict:
+    """ Pool and logging options shared by every engine created for the given url """
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # In memory sqlite databases use a single connection pool which doesnt accept sizing
+    if make_url(database_url).database not in (None, "", ":memory:"):
+        options.update({
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        })
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """ Let readers and the writer work concurrently and wait on locks instead of failing """
+    cursor = dbapi_connection.cursor()
+    # Lets the retention job hand freed pages back, existing databases need a one off VACUUM to switch mode
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def create_database_engine(database_url: str) -> Engine:
+    sync_engine = create_engine(database_url, **get_engine_options(database_url))
+    if is_sqlite(database_url):
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    return sync_engine
+
+def create_async_database_engine(database_url: str):
+    async_engine = create_async_engine(get_async_database_url(database_url), **get_engine_options(database_url))
+    if is_sqlite(database_url):
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+# Create an engine for the database connection, shared by the casbin adapter and migrations
+engine = create_database_engine(DATABASE_URL)
+
+# Create an async engine used by the api, so database I/O never blocks the event loop
+async_engine = create_async_database_engine(DATABASE_URL)
+
+# Read only queries are routed to the replica when one is configured
+if settings.DATABASE_READ_REPLICA_URL:
+    read_async_engine = create_async_database_engine(settings.DATABASE_READ_REPLICA_URL)
+else:
+    read_async_engine = async_engine
 
 # Define a base class for ORM models
 Base = declarative_base()
@@ -15,11 +83,19 @@ Base = declarative_base()
 # Set up a session to interact with the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Set up an async session, objects are kept loaded after commit as lazy loading is not allowed in async
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Async session bound to the read engine, only used for queries which never write
+ReadAsyncSessionLocal = async_sessionmaker(read_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_db():
+    """ Dependency to provide an async session for DB interaction """
+    async with AsyncSessionLocal() as db:
+        yield db
 
-def get_db():
-    """ Dependency to provide a session for DB interaction """
-    db = SessionLocal()
-    try:
+async def get_read_db():
+    """ Dependency to provide an async session for read only DB interaction """
+    async with ReadAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,11 +1,20 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.v1.api import api_router_v1
+from app.services.notification_hub import notification_hub
+from app.services.auth_service import principal_cache
+from app.services.role_service import role_cache
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 
-# TODO write the cleanup logic for cleaning up otp's using temporlio
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The temporal client is connected on first use and shared by every request, temporalio has no way
+    # to close it so its connection goes away with the process
+    yield
+    await notification_hub.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,4 +28,14 @@ app.add_middleware(
 def server_health():
     return {"message": "Server successfully running in port 8000"}
 
+@app.get("/metrics")
+def server_metrics():
+    # Counters of this process only, every worker process keeps its own
+    return {
+        "notification_hub": notification_hub.stats(),
+        "role_cache": role_cache.stats(),
+        # The principal cache can be turned off with PRINCIPAL_CACHE_ENABLED
+        "principal_cache": principal_cache.stats() if principal_cache is not None else None,
+    }
+
 app.include_router(api_router_v1, prefix="/v1")
\ No newline at end of file
@@ -1,14 +1,18 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import get_settings
 from jose import JWTError, jwt
-from app.api.v1.schemas.user import TokenData
+from app.api.v1.schemas.user import TokenData, CurrentUser
 from app.db import models
 from app.db.session import get_db
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from itsdangerous import URLSafeTimedSerializer
+from app.services.cache_service import TwoLevelCache
+from app.services.redis_service import redis_client
+import hashlib
+import time
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/v1/auth/login')
@@ -17,14 +21,19 @@ SECRET_KEY = get_settings().SECRET_KEY
 ALGORITHM = get_settings().ALGORITHM
 ACCESS_TOKEN_EXPIRY_MINUTES = get_settings().ACCESS_TOKEN_EXPIRY_MINUTES
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
 serializer = URLSafeTimedSerializer(
         secret_key=SECRET_KEY,
         salt="email-configuration"
     )
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Cache of token hash -> authenticated user, entries never outlive the token
+principal_cache = TwoLevelCache(
+    "principal",
+    ttl=get_settings().PRINCIPAL_CACHE_TTL_SECONDS,
+    local_ttl=get_settings().PRINCIPAL_CACHE_LOCAL_TTL_SECONDS,
+    local_maxsize=get_settings().PRINCIPAL_CACHE_LOCAL_MAXSIZE,
+    redis_client=redis_client,
+) if get_settings().PRINCIPAL_CACHE_ENABLED else None
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -35,24 +44,48 @@ def create_access_token(data: dict):
 
     return encoded_jwt
 
-def verify_access_token(token: str, credential_exception):
+def decode_access_token(token: str, credential_exception) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        id: str = payload.get("user_id")
-        if id is None:
+        if payload.get("user_id") is None:
             raise credential_exception
-        token_data = TokenData(id=str(id))
-        return token_data
+        return payload
     except JWTError:
         raise credential_exception
+
+def verify_access_token(token: str, credential_exception):
+    payload = decode_access_token(token, credential_exception)
+    token_data = TokenData(id=str(payload.get("user_id")))
+    return token_data
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
     
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credential_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Could not valid credentials", headers={"WWW-Authenticate":"Bearer"})
-    token = verify_access_token(token, credential_exception)
-    user = db.query(models.User).filter(models.User.id == token.id).first()
+    # Repeated tokens skip both the jwt decode and the database lookup
+    if principal_cache is not None:
+        cached_user = await principal_cache.get(hash_token(token))
+        if cached_user is not None:
+            return CurrentUser(**cached_user)
+
+    payload = decode_access_token(token, credential_exception)
+    user = await db.scalar(select(models.User).where(models.User.id == int(payload.get("user_id"))))
     if not user:
         raise credential_exception
-    return user
+    current_user = CurrentUser.model_validate(user)
+
+    if principal_cache is not None:
+        await principal_cache.set(
+            hash_token(token), current_user.model_dump(),
+            ttl=int(payload.get("exp", 0) - time.time()), group=str(current_user.id)
+        )
+    return current_user
+
+async def invalidate_user_principals(user_id: int):
+    """ Drop every cached token of the user, called when the account is deleted or its password changes """
+    if principal_cache is not None:
+        await principal_cache.delete_group(str(user_id))
 
 def create_url_safe_token(data: dict):
     token = serializer.dumps(data)
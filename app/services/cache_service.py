@@ -0,0 +1,180 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+class LocalTTLCache:
+    """ In process LRU cache where every entry expires after the given ttl """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None, group: Optional[str] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.entries[key] = (time.monotonic() + ttl, value, group)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def delete_group(self, group: str):
+        for key in [key for key, (_, _, entry_group) in self.entries.items() if entry_group == group]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+
+class TwoLevelCache:
+    """
+    Cache of json serializable values with a short lived in process L1 in front of redis.
+    Redis errors are logged and treated as misses so the callers fall back to the database.
+    """
+
+    def __init__(self, namespace: str, ttl: int, local_ttl: float, local_maxsize: int, redis_client: Optional[redis.Redis] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalTTLCache(local_ttl, local_maxsize)
+        # Tests can swap in a fakeredis client, None keeps the cache in process only
+        self.redis = redis_client
+        # Bumped by every invalidation of this process, a value read before one isn't cached after it
+        self.invalidations = 0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def redis_group_key(self, group: str) -> str:
+        return f"cache:{self.namespace}:group:{group}"
+
+    def redis_generation_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:generation:{key}"
+
+    async def generation(self, key: str) -> Tuple[int, Optional[str]]:
+        """ Taken before reading the value from the database and passed to set, which skips the write if the key was invalidated since """
+        redis_generation = None
+        if self.redis is not None:
+            try:
+                redis_generation = await self.redis.get(self.redis_generation_key(key))
+            except redis.RedisError as e:
+                logger.warning("Redis cache read failed for %s: %s", self.namespace, e)
+        return self.invalidations, redis_generation
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(self.redis_key(key))
+                    pipe.ttl(self.redis_key(key))
+                    cached, remaining_ttl = await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning("Redis cache read failed for %s: %s", self.namespace, e)
+                cached = None
+            if cached is not None:
+                entry = json.loads(cached)
+                # Keep the local copy from outliving the redis entry
+                self.local.set(key, entry["value"], remaining_ttl if remaining_ttl > 0 else None, entry["group"])
+                self.redis_hits += 1
+                return entry["value"]
+
+        self.misses += 1
+        return None
+
+    async def set(
+        self, key: str, value, ttl: Optional[int] = None, group: Optional[str] = None,
+        generation: Optional[Tuple[int, Optional[str]]] = None
+    ):
+        """
+        Entries can expire earlier than the cache ttl, and can be tagged with a group for bulk invalidation.
+        With the generation taken before the value was read, a value invalidated meanwhile is not cached.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        if generation is not None and generation[0] != self.invalidations:
+            return
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=generation is not None) as pipe:
+                    if generation is not None:
+                        # The write fails with a WatchError if another process invalidates the key before it
+                        await pipe.watch(self.redis_generation_key(key))
+                        if await pipe.get(self.redis_generation_key(key)) != generation[1]:
+                            return
+                        pipe.multi()
+                    pipe.set(self.redis_key(key), json.dumps({"value": value, "group": group}), ex=ttl)
+                    if group is not None:
+                        pipe.sadd(self.redis_group_key(group), key)
+                        pipe.expire(self.redis_group_key(group), self.ttl)
+                    await pipe.execute()
+            except redis.WatchError:
+                return
+            except redis.RedisError as e:
+                logger.warning("Redis cache write failed for %s: %s", self.namespace, e)
+        # An invalidation of this process may have run while redis was written
+        if generation is not None and generation[0] != self.invalidations:
+            return
+        self.local.set(key, value, ttl, group)
+
+    async def delete(self, key: str):
+        self.invalidations += 1
+        self.local.delete(key)
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.delete(self.redis_key(key))
+                    # Outlives any value read before the invalidation, so a late set of it is skipped
+                    pipe.incr(self.redis_generation_key(key))
+                    pipe.expire(self.redis_generation_key(key), self.ttl)
+                    await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning("Redis cache invalidation failed for %s: %s", self.namespace, e)
+
+    async def delete_group(self, group: str):
+        self.invalidations += 1
+        self.local.delete_group(group)
+        if self.redis is not None:
+            try:
+                keys = await self.redis.smembers(self.redis_group_key(group))
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.delete(self.redis_group_key(group), *[self.redis_key(key) for key in keys])
+                    for key in keys:
+                        pipe.incr(self.redis_generation_key(key))
+                        pipe.expire(self.redis_generation_key(key), self.ttl)
+                    await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning("Redis cache invalidation failed for %s: %s", self.namespace, e)
+
+    def stats(self) -> dict:
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_size": len(self.local.entries),
+        }
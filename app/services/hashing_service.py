@@ -0,0 +1,74 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from app.core.config import get_settings
+
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+
+def bcrypt_hash(secret: str) -> str:
+    return pwd_context.hash(secret)
+
+def bcrypt_verify(secret: str, hashed_secret: str) -> bool:
+    return pwd_context.verify(secret, hashed_secret)
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls on a thread or process pool, rejecting new calls once
+    every worker is busy and the queue in front of them is full.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.limit = workers + max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.executor: Optional[Executor] = None
+
+    def get_executor(self) -> Executor:
+        # Created on first use so importing the module never starts processes
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self.executor
+
+    async def run(self, func, *args):
+        # Only touched from the event loop, so the counter needs no lock
+        if self.pending >= self.limit:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again", headers={"Retry-After": "1"})
+        loop = asyncio.get_running_loop()
+        future = self.get_executor().submit(func, *args)
+        self.pending += 1
+        # Released when the call itself finishes, a cancelled request keeps its worker busy until then
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.release))
+        return await asyncio.wrap_future(future)
+
+    def release(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+hashing_executor = BoundedExecutor(
+    get_settings().HASHING_EXECUTOR,
+    workers=get_settings().HASHING_WORKERS,
+    max_queue=get_settings().HASHING_MAX_QUEUE,
+)
+
+async def hash_secret(secret: str) -> str:
+    """ Hash a password or otp with bcrypt without blocking the event loop """
+    return await hashing_executor.run(bcrypt_hash, secret)
+
+async def verify_secret(secret: str, hashed_secret: str) -> bool:
+    """ Verify a password or otp against its bcrypt hash without blocking the event loop """
+    return await hashing_executor.run(bcrypt_verify, secret, hashed_secret)
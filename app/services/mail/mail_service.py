@@ -2,11 +2,12 @@ from app.core.config import get_settings
 from fastapi_mail import FastMail, ConnectionConfig, MessageSchema, MessageType
 from pathlib import Path
 from typing import List
-from app.workers.temporal.workflows.user_email_workflow import UserEmailWorkflow
+from app.workers.temporal.workflows.user_email_workflow import UserEmailWorkflow, BatchEmailWorkflow
 from typing import Union, Optional
 import uuid
-from temporalio.client import Client
+from app.services.temporal_service import get_temporal_client
 from pydantic import EmailStr
+from app.services.mail.smtp_service import SMTPConnectionPool
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -18,10 +19,10 @@ mail_configuation = ConnectionConfig(
     MAIL_PORT = get_settings().MAIL_PORT,
     MAIL_SERVER = get_settings().MAIL_SERVER,
     MAIL_FROM_NAME = get_settings().MAIL_FROM_NAME,
-    MAIL_STARTTLS = False,
-    MAIL_SSL_TLS = True,
-    USE_CREDENTIALS = True,
-    VALIDATE_CERTS = True,
+    MAIL_STARTTLS = get_settings().MAIL_STARTTLS,
+    MAIL_SSL_TLS = get_settings().MAIL_SSL_TLS,
+    USE_CREDENTIALS = get_settings().USE_CREDENTIALS,
+    VALIDATE_CERTS = get_settings().VALIDATE_CERTS,
     TEMPLATE_FOLDER= Path(BASE_DIR, 'templates')
 )
 
@@ -29,6 +30,9 @@ mail = FastMail(
     config=mail_configuation
 )
 
+# Smtp connections shared by the email activities of a worker
+smtp_pool = SMTPConnectionPool(mail_configuation, size=get_settings().EMAIL_SMTP_POOL_SIZE)
+
 def create_message(recipients: List[str], subject: str, body: str):
     message = MessageSchema(
         recipients=recipients,
@@ -38,19 +42,16 @@ def create_message(recipients: List[str], subject: str, body: str):
     )
     return message
 
-async def create_temporal_client():
-    return await Client.connect(get_settings().TEMPORAL_URL)
-
 async def start_email_workflow(email_addresses: Optional[Union[EmailStr, List[EmailStr]]], subject: str, html_content):
     if isinstance(email_addresses, list):
         email_addresses = ','.join(email_addresses)
     task_id = uuid.uuid4().hex
-    client = await create_temporal_client()
+    client = await get_temporal_client()
     email_workflow = await client.execute_workflow(
         UserEmailWorkflow.run,
         id=task_id,
         task_queue="user-email-task-queue",
-        args=[email_addresses, subject, html_content]
+        args=[email_addresses, subject, html_content, get_settings().EMAIL_BATCH_SIZE, get_settings().EMAIL_CONCURRENCY]
     )
     return email_workflow
 
@@ -59,4 +60,25 @@ async def dispatch_verification_email(email: str, subject: str, html_content: st
         message = create_message([email], subject, html_content)
         await mail.send_message(message)
     except Exception as e:
-        print("Failed to send email to user", e)
\ No newline at end of file
+        print("Failed to send email to user", e)
+
+async def start_batch_email_workflow(template_name: str, subject: str, context: dict, recipients: List[dict]):
+    """
+    Send a template to every recipient, each recipient is a dict with the email and its own template context.
+    The emails are rendered by the worker, and the recipients are split over as few workflows as the payload limit allows.
+    """
+    client = await get_temporal_client()
+    max_recipients = get_settings().EMAIL_WORKFLOW_MAX_RECIPIENTS
+    workflow_ids = []
+    for start in range(0, len(recipients), max_recipients):
+        handle = await client.start_workflow(
+            BatchEmailWorkflow.run,
+            args=[
+                template_name, subject, context, recipients[start:start + max_recipients],
+                get_settings().EMAIL_BATCH_SIZE, get_settings().EMAIL_CONCURRENCY
+            ],
+            id=uuid.uuid4().hex,
+            task_queue="user-email-task-queue"
+        )
+        workflow_ids.append(handle.id)
+    return workflow_ids
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import List, Optional
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+
+logger = logging.getLogger(__name__)
+
+class SMTPConnectionPool:
+    """
+    Keeps up to size authenticated smtp connections open between sends, so a batch of emails
+    pays for the connect, tls handshake and login once instead of once per email.
+    """
+
+    def __init__(self, config: ConnectionConfig, size: int):
+        self.config = config
+        self.size = size
+        self.idle: List[aiosmtplib.SMTP] = []
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    async def connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            timeout=self.config.TIMEOUT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+            local_hostname=self.config.LOCAL_HOSTNAME,
+        )
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self):
+        # Created on first use so the pool binds to the loop it's used from
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.size)
+        async with self.semaphore:
+            smtp = self.idle.pop() if self.idle else None
+            if smtp is None or not smtp.is_connected:
+                smtp = await self.connect()
+            try:
+                yield smtp
+            finally:
+                if smtp.is_connected:
+                    self.idle.append(smtp)
+
+    async def close(self):
+        while self.idle:
+            smtp = self.idle.pop()
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+    def create_message(self, email: str, subject: str, html_content: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = formataddr((self.config.MAIL_FROM_NAME, self.config.MAIL_FROM)) if self.config.MAIL_FROM_NAME else self.config.MAIL_FROM
+        message["To"] = email
+        message["Subject"] = subject
+        message.set_content(html_content, subtype="html")
+        return message
+
+    async def send_emails(self, emails: List[dict]) -> List[dict]:
+        """
+        Send each email, a dict with the email address, subject and html_content, over one pooled connection.
+        A refused recipient doesn't stop the rest, and a dropped connection is reopened once.
+        """
+        results = []
+        async with self.connection() as smtp:
+            for email in emails:
+                message = self.create_message(email["email"], email["subject"], email["html_content"])
+                try:
+                    try:
+                        await smtp.send_message(message)
+                    except aiosmtplib.SMTPServerDisconnected:
+                        await smtp.connect()
+                        if self.config.USE_CREDENTIALS:
+                            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+                        await smtp.send_message(message)
+                    results.append({"email": email["email"], "sent": True})
+                except aiosmtplib.SMTPException as e:
+                    logger.warning("Failed to send email to %s: %s", email["email"], e)
+                    results.append({"email": email["email"], "sent": False, "error": str(e)})
+        return results
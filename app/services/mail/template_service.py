@@ -0,0 +1,71 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+from app.core.config import get_settings
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+def create_bytecode_cache() -> FileSystemBytecodeCache:
+    """ Compiled templates are shared on disk, so new processes and pool workers skip compiling them """
+    cache_dir = get_settings().EMAIL_TEMPLATE_CACHE_DIR
+    if cache_dir is None:
+        # Jinja creates a private per user directory and checks its owner, a shared temp path could be planted
+        return FileSystemBytecodeCache()
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    return FileSystemBytecodeCache(cache_dir)
+
+# Templates are not reloaded from disk once compiled, autoescape matches the Jinja2Templates defaults
+template_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=False,
+    bytecode_cache=create_bytecode_cache(),
+)
+
+# Compile every template once when the module is imported
+templates = {name: template_environment.get_template(name) for name in template_environment.list_templates()}
+
+# Created on the first large batch, renders in other processes so the worker's event loop and GIL stay free
+process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_template(template_name: str) -> Template:
+    template = templates.get(template_name)
+    if template is None:
+        raise ValueError(f"Unknown email template {template_name}")
+    return template
+
+def render_email(template_name: str, context: dict) -> str:
+    return get_template(template_name).render(context)
+
+def render_emails(template_name: str, context: dict, recipients: List[dict]) -> List[str]:
+    """ Render the template once per recipient, the recipient's values override the shared context """
+    template = get_template(template_name)
+    return [template.render({**context, **recipient}) for recipient in recipients]
+
+async def render_email_async(template_name: str, context: dict) -> str:
+    """ Render a single email in a thread so request handlers don't block the event loop """
+    return await run_in_threadpool(render_email, template_name, context)
+
+async def render_emails_async(template_name: str, context: dict, recipients: List[dict]) -> List[str]:
+    """ Small batches render in a thread, large ones in a process pool split into one chunk per process """
+    global process_pool
+    settings = get_settings()
+    if len(recipients) < settings.EMAIL_RENDER_PROCESS_THRESHOLD or settings.EMAIL_RENDER_PROCESSES < 1:
+        return await run_in_threadpool(render_emails, template_name, context, recipients)
+
+    if process_pool is None:
+        # Spawned rather than forked, forking a process running the temporal worker threads isn't safe
+        process_pool = ProcessPoolExecutor(max_workers=settings.EMAIL_RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+
+    loop = asyncio.get_running_loop()
+    chunk_size = -(-len(recipients) // settings.EMAIL_RENDER_PROCESSES)
+    chunks = await asyncio.gather(*[
+        loop.run_in_executor(process_pool, render_emails, template_name, context, recipients[start:start + chunk_size])
+        for start in range(0, len(recipients), chunk_size)
+    ])
+    return [html_content for chunk in chunks for html_content in chunk]
@@ -3,13 +3,23 @@ import json
 from minio.error import S3Error
 from app.core.config import get_settings
 from temporalio.client import Client
-from temporalio.common import SearchAttributeKey, SearchAttributePair, TypedSearchAttributes
+from temporalio.common import WorkflowIDConflictPolicy, WorkflowIDReusePolicy
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from temporalio.service import RPCError, RPCStatusCode
+from app.services.temporal_service import get_temporal_client
 from fastapi import HTTPException
 from app.services.vault_service import get_secret
 from app.workers.temporal.workflows.create_bucket_workflow import BucketCreationWorkFlow
 from app.services.notification_service import start_app_notifications_workflow
-import uuid
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+from datetime import timezone
+from typing import Dict, List, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import models
+
+logger = logging.getLogger(__name__)
 
 def create_minio_client(credentials: dict):
     minio_client = Minio(
@@ -21,10 +31,10 @@ def create_minio_client(credentials: dict):
     return minio_client
 
 # Create a bucket in minio
-async def create_minio_bucket(team_id: int, bucket_name: str, credentails: dict, db: Session):
+async def create_minio_bucket(team_id: int, bucket_name: str, credentails: dict):
     minio_client = create_minio_client(credentails)
     minio_client.make_bucket(bucket_name)
-    await start_app_notifications_workflow([{"team_id": team_id}], f"New bucket added to the team with name {bucket_name}", db)
+    await start_app_notifications_workflow([{"team_id": team_id}], f"New bucket added to the team with name {bucket_name}")
 
 # Check bucket exists in minio
 def check_bucket_exist(bucket_name: str, credentails: dict):
@@ -42,36 +52,75 @@ def list_all_buckets(credentials: dict):
     buckets = minio_client.list_buckets()
     return buckets
 
-# Create a temporal client
-async def create_temporal_client():
-    return await Client.connect(get_settings().TEMPORAL_URL)
-
 async def get_workflow_handle(client: Client, workflow_id: str):
     return client.get_workflow_handle(workflow_id)
 
+def get_bucket_request_workflow_id(team_id: int, bucket_name: str) -> str:
+    return f"bucket-{team_id}-{bucket_name}"
+
 # Create bucket request using temporlio
-async def create_bucket_request_temporilio(user_id: int, team_id: int, bucket_name: str, team_name: str):
-    user_id_key = SearchAttributeKey.for_int("UserId")
-    bucket_name_key = SearchAttributeKey.for_keyword("BucketName")
-    team_id_key = SearchAttributeKey.for_int("TeamId")
-
-    client = await create_temporal_client()
-
-    task_id = uuid.uuid4().hex
-
-    handle = await client.start_workflow(
-        BucketCreationWorkFlow.create_new_bucket,
-        args=[bucket_name, team_name, team_id],
-        id=f"bucket-{task_id}",
-        task_queue="bucket-creation-task-queue",
-        search_attributes=TypedSearchAttributes([
-            SearchAttributePair(user_id_key, user_id),
-            SearchAttributePair(bucket_name_key, bucket_name),
-            SearchAttributePair(team_id_key, team_id)
-        ])
-    )
+async def create_bucket_request_temporilio(user_id: int, team_id: int, bucket_name: str, team_name: str, db: AsyncSession):
+    client = await get_temporal_client()
+
+    # One workflow per team and bucket, a request repeated while one is open joins it instead of starting another
+    workflow_id = get_bucket_request_workflow_id(team_id, bucket_name)
+    try:
+        handle = await client.start_workflow(
+            BucketCreationWorkFlow.create_new_bucket,
+            args=[bucket_name, team_name, team_id],
+            id=workflow_id,
+            task_queue="bucket-creation-task-queue",
+            # Closed requests can be made again
+            id_reuse_policy=WorkflowIDReusePolicy.ALLOW_DUPLICATE,
+            id_conflict_policy=WorkflowIDConflictPolicy.FAIL
+        )
+    except WorkflowAlreadyStartedError:
+        return workflow_id
+
+    # Record the request so the pending requests are listed from the database instead of temporal visibility,
+    # a new run of a closed request takes over its row
+    bucket_request = await db.scalar(select(models.BucketRequest).where(models.BucketRequest.workflow_id == workflow_id))
+    if bucket_request is None:
+        bucket_request = models.BucketRequest(workflow_id=workflow_id, team_id=team_id, bucket_name=bucket_name)
+        db.add(bucket_request)
+    bucket_request.run_id = handle.first_execution_run_id
+    bucket_request.user_id = user_id
+    bucket_request.status = models.BucketRequestStatus.PENDING
+    bucket_request.created_at = func.now()
+    await db.commit()
     return handle.id
 
+async def backfill_bucket_requests(db: AsyncSession) -> int:
+    """
+    Record the running workflows started before requests were kept in the database, so they can be listed
+    and decided. Their requester, team and bucket come from the search attributes they were started with.
+    Returns how many requests were added.
+    """
+    client = await get_temporal_client()
+    added = 0
+    async for execution in client.list_workflows('WorkflowType="BucketCreationWorkFlow" and ExecutionStatus="Running"'):
+        if await db.scalar(select(models.BucketRequest.id).where(models.BucketRequest.workflow_id == execution.id)):
+            continue
+        attributes = execution.search_attributes
+        user_id = attributes.get("UserId", [None])[0]
+        team_id = attributes.get("TeamId", [None])[0]
+        bucket_name = attributes.get("BucketName", [None])[0]
+        if user_id is None or team_id is None or bucket_name is None:
+            logger.warning("Skipping bucket request %s without its search attributes", execution.id)
+            continue
+        db.add(models.BucketRequest(
+            workflow_id=execution.id,
+            run_id=execution.run_id,
+            user_id=user_id,
+            team_id=team_id,
+            bucket_name=bucket_name,
+            status=models.BucketRequestStatus.PENDING,
+            created_at=execution.start_time.astimezone(timezone.utc).replace(tzinfo=None),
+        ))
+        added += 1
+    await db.commit()
+    return added
+
 # # Create Bucket temporilio activity
 # async def create_bucket_temporilio_activity(team_name: str, bucket_name: str):
 #     # Get the secret credentials from the vault
@@ -86,72 +135,169 @@ async def create_bucket_request_temporilio(user_id: int, team_id: int, bucket_na
 
 #     return f"Bucket {bucket_name} created successfully!"
 
-async def list_all_buckets_request_team(team_id: int):
-    pending_requests = []
-
-    client = await create_temporal_client()
-
-    async for workflow in client.list_workflows(f'TeamId="{team_id}" and ExecutionStatus = "Running"'):
-        pending_requests.append({
-            "workflow_id": workflow.id,
-            "run_id": workflow.run_id,
-            "status": workflow.status.name,  # Should be RUNNING for pending workflows
-            "start_time": workflow.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "bucket_name": workflow.search_attributes.get("BucketName", ["Unknown"])[0]
-        })
-
-    return {"pending_requests": pending_requests}
-
-async def list_all_buckets_request_user(user_id: int, team_id: int):
-    pending_requests = []
-
-    client = await create_temporal_client()
-
-    async for workflow in client.list_workflows(f'TeamId="{team_id}" and UserId="{user_id}" and ExecutionStatus = "Running"'):
-        pending_requests.append({
-            "workflow_id": workflow.id,
-            "run_id": workflow.run_id,
-            "status": workflow.status.name,  # Should be RUNNING for pending workflows
-            "start_time": workflow.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "bucket_name": workflow.search_attributes.get("BucketName", ["Unknown"])[0]
-        })
-
-    return {"pending_requests": pending_requests}
-
-# Approve bucket creation request
-async def approve_create_bucket(workflow_id: str):
-    client = await create_temporal_client()
-
+async def list_bucket_requests(db: AsyncSession, filters: list, limit: int, before: Optional[int] = None):
+    """ Keyset page of the bucket requests matching the filters, newest first """
+    if before is not None:
+        filters = [*filters, models.BucketRequest.id < before]
+    bucket_requests = (await db.scalars(
+        select(models.BucketRequest).where(*filters).order_by(models.BucketRequest.id.desc()).limit(limit)
+    )).all()
+
+    pending_requests = [{
+        "workflow_id": bucket_request.workflow_id,
+        "run_id": bucket_request.run_id,
+        "user_id": bucket_request.user_id,
+        "status": bucket_request.status.name,
+        "start_time": bucket_request.created_at.strftime("%Y-%m-%d %H:%M:%S") if bucket_request.created_at else None,
+        "bucket_name": bucket_request.bucket_name
+    } for bucket_request in bucket_requests]
+
+    # Pass the cursor back as before to get the next page
+    next_cursor = bucket_requests[-1].id if len(bucket_requests) == limit else None
+    return {"pending_requests": pending_requests, "next_cursor": next_cursor}
+
+async def list_all_buckets_request_team(team_id: int, db: AsyncSession, limit: int = 50, before: Optional[int] = None):
+    # Served by the (team_id, status) index
+    return await list_bucket_requests(db, [
+        models.BucketRequest.team_id == team_id,
+        models.BucketRequest.status == models.BucketRequestStatus.PENDING
+    ], limit, before)
+
+async def list_all_buckets_request_user(user_id: int, team_id: int, db: AsyncSession, limit: int = 50, before: Optional[int] = None):
+    # Served by the (user_id, team_id) index
+    return await list_bucket_requests(db, [
+        models.BucketRequest.user_id == user_id,
+        models.BucketRequest.team_id == team_id,
+        models.BucketRequest.status == models.BucketRequestStatus.PENDING
+    ], limit, before)
+
+async def set_bucket_request_status(
+    workflow_id: str, status: models.BucketRequestStatus, db: AsyncSession,
+    from_statuses: Optional[List[models.BucketRequestStatus]] = None
+) -> bool:
+    """ Move the request to the status, only from one of from_statuses when given, returning whether it changed """
+    filters = [models.BucketRequest.workflow_id == workflow_id]
+    if from_statuses is not None:
+        filters.append(models.BucketRequest.status.in_(from_statuses))
+    result = await db.execute(update(models.BucketRequest).where(*filters).values(status=status))
+    return result.rowcount > 0
+
+async def decide_bucket_request(workflow_id: str, team_id: int, approved: bool, db: AsyncSession):
+    """ Approve or reject a pending request of the team and signal its workflow """
+    bucket_request = await db.scalar(select(models.BucketRequest).where(
+        models.BucketRequest.workflow_id == workflow_id,
+        models.BucketRequest.team_id == team_id
+    ))
+    if not bucket_request:
+        raise HTTPException(status_code=404, detail='Bucket request not found!')
+
+    client = await get_temporal_client()
     handle = await get_workflow_handle(client, workflow_id)
 
-    workflow_info = await handle.describe()
-
-    user_id = workflow_info.search_attributes.get('UserId', [None])[0]
-    bucket_name = workflow_info.search_attributes.get('BucketName', [None])[0]
-
-    if workflow_info.status == 2:
+    # Claim the request before signalling, so a concurrent approval and rejection can't both go through,
+    # committed so the signal doesn't hold a write lock
+    status = models.BucketRequestStatus.APPROVED if approved else models.BucketRequestStatus.REJECTED
+    if not await set_bucket_request_status(workflow_id, status, db, from_statuses=[models.BucketRequestStatus.PENDING]):
         raise HTTPException(status_code=404, detail='Workflow already completed!')
+    await db.commit()
+
+    try:
+        await handle.signal("admin_approval", approved)
+    except Exception as e:
+        # The workflow gave up waiting for a decision, otherwise the request goes back to pending to be retried
+        expired = isinstance(e, RPCError) and e.status == RPCStatusCode.NOT_FOUND
+        await set_bucket_request_status(
+            workflow_id, models.BucketRequestStatus.EXPIRED if expired else models.BucketRequestStatus.PENDING, db,
+            from_statuses=[status]
+        )
+        await db.commit()
+        if expired:
+            raise HTTPException(status_code=404, detail='Workflow already completed!')
+        raise
+
+    return bucket_request.user_id, bucket_request.bucket_name
 
-    # Send approval signal
-    await handle.signal("admin_approval", True)
-
-    return user_id, bucket_name
+# Approve bucket creation request
+async def approve_create_bucket(workflow_id: str, team_id: int, db: AsyncSession):
+    return await decide_bucket_request(workflow_id, team_id, True, db)
 
 # Reject bucket creation request
-async def reject_create_bucket(workflow_id: str):
-    client = await create_temporal_client()
-
-    handle = await get_workflow_handle(client, workflow_id)
-
-    workflow_info = await handle.describe()
-
-    user_id = workflow_info.search_attributes.get('UserId', [None])[0]
-    bucket_name = workflow_info.search_attributes.get('BucketName', [None])[0]
-
-    if workflow_info.status == 2:
-        raise HTTPException(status_code=404, detail='Workflow already completed!')
-
-    # Send approval signal
-    await handle.signal("admin_approval", False)
-
-    return user_id, bucket_name
\ No newline at end of file
+async def reject_create_bucket(workflow_id: str, team_id: int, db: AsyncSession):
+    return await decide_bucket_request(workflow_id, team_id, False, db)
+
+async def decide_bucket_requests(workflow_ids: List[str], team_id: int, approved: bool, db: AsyncSession):
+    """
+    Approve or reject many pending requests of the team. The requests are claimed in one update and their
+    workflows are signalled a few at a time. Returns the outcome of each workflow id, and the decided bucket
+    names of each requester so they can be notified once.
+    """
+    settings = get_settings()
+    workflow_ids = list(dict.fromkeys(workflow_ids))
+    if len(workflow_ids) > settings.BUCKET_REQUEST_BULK_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BUCKET_REQUEST_BULK_MAX_IDS} requests can be decided at once")
+
+    outcomes = {workflow_id: "not_found" for workflow_id in workflow_ids}
+    status = models.BucketRequestStatus.APPROVED if approved else models.BucketRequestStatus.REJECTED
+
+    # Requests of the team which aren't claimed below are no longer pending
+    existing = await db.scalars(
+        select(models.BucketRequest.workflow_id)
+        .where(models.BucketRequest.team_id == team_id, models.BucketRequest.workflow_id.in_(workflow_ids))
+    )
+    for workflow_id in existing:
+        outcomes[workflow_id] = "already_completed"
+
+    # Claim the pending ones before signalling, committed so the signals don't hold a write lock
+    claimed = (await db.execute(
+        update(models.BucketRequest)
+        .where(
+            models.BucketRequest.team_id == team_id,
+            models.BucketRequest.workflow_id.in_(workflow_ids),
+            models.BucketRequest.status == models.BucketRequestStatus.PENDING
+        )
+        .values(status=status)
+        .returning(models.BucketRequest.workflow_id, models.BucketRequest.user_id, models.BucketRequest.bucket_name)
+    )).all()
+    await db.commit()
+
+    client = await get_temporal_client()
+    semaphore = asyncio.Semaphore(settings.BUCKET_REQUEST_BULK_CONCURRENCY)
+
+    async def signal(workflow_id: str) -> str:
+        async with semaphore:
+            try:
+                await client.get_workflow_handle(workflow_id).signal("admin_approval", approved)
+                return status.value
+            except RPCError as e:
+                # The workflow gave up waiting for a decision
+                if e.status == RPCStatusCode.NOT_FOUND:
+                    return models.BucketRequestStatus.EXPIRED.value
+                logger.warning("Failed to signal bucket request %s: %s", workflow_id, e)
+                return "failed"
+
+    results = await asyncio.gather(*[signal(row.workflow_id) for row in claimed])
+
+    # Expired requests are closed, and the ones which couldn't be signalled go back to pending to be retried
+    expired = [row.workflow_id for row, result in zip(claimed, results) if result == models.BucketRequestStatus.EXPIRED.value]
+    failed = [row.workflow_id for row, result in zip(claimed, results) if result == "failed"]
+    if expired:
+        await db.execute(
+            update(models.BucketRequest)
+            .where(models.BucketRequest.workflow_id.in_(expired))
+            .values(status=models.BucketRequestStatus.EXPIRED)
+        )
+    if failed:
+        await db.execute(
+            update(models.BucketRequest)
+            .where(models.BucketRequest.workflow_id.in_(failed))
+            .values(status=models.BucketRequestStatus.PENDING)
+        )
+    await db.commit()
+
+    bucket_names_by_user: Dict[int, List[str]] = {}
+    for row, result in zip(claimed, results):
+        outcomes[row.workflow_id] = result
+        if result == status.value:
+            bucket_names_by_user.setdefault(row.user_id, []).append(row.bucket_name)
+
+    return outcomes, bucket_names_by_user
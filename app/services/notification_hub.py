@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+import redis.asyncio as redis
+from app.core.config import get_settings
+from app.services.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+class SlowConsumer(Exception):
+    """ Raised when a websocket can't keep up with its messages and has to be disconnected """
+
+class SendQueue:
+    """
+    Bounded queue of the messages waiting to be sent to one websocket. Putting never waits, so a slow
+    client can't hold up the other listeners, and a full queue is handled by the overflow policy.
+    """
+
+    def __init__(self, maxsize: int, overflow_policy: str):
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.messages: deque = deque()
+        self.dropped = 0
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def put(self, message: str) -> int:
+        """ Queue the message, returning how many messages were dropped to make room """
+        if self.overflowed:
+            self.dropped += 1
+            return 1
+        dropped = 0
+        if len(self.messages) >= self.maxsize:
+            if self.overflow_policy == "drop_oldest":
+                self.messages.popleft()
+                dropped = 1
+            elif self.overflow_policy == "coalesce":
+                # The client only gets the newest message of the backlog
+                dropped = len(self.messages)
+                self.messages.clear()
+            else:
+                # The backlog is thrown away with the connection
+                dropped = len(self.messages) + 1
+                self.overflowed = True
+                self.messages.clear()
+                self.ready.set()
+                self.dropped += dropped
+                return dropped
+        self.messages.append(message)
+        self.dropped += dropped
+        self.ready.set()
+        return dropped
+
+    async def get(self) -> str:
+        while not self.messages and not self.overflowed:
+            self.ready.clear()
+            await self.ready.wait()
+        if self.overflowed:
+            raise SlowConsumer("Send queue overflowed")
+        return self.messages.popleft()
+
+class NotificationHub:
+    """
+    One redis subscriber connection per process, shared by every websocket of the process.
+    A channel is subscribed when its first local listener joins and unsubscribed after the last one leaves,
+    and every message is put on the bounded send queue of each local listener of its channel.
+    """
+
+    def __init__(
+        self, redis_client: redis.Redis, queue_size: int, overflow_policy: str, write_timeout: float,
+        reconnect_delay: float = 1.0
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy!r}, expected one of {', '.join(OVERFLOW_POLICIES)}")
+        self.redis = redis_client
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.write_timeout = write_timeout
+        self.reconnect_delay = reconnect_delay
+        self.listeners: Dict[str, Set[SendQueue]] = {}
+        self.pubsub = None
+        self.reader: Optional[asyncio.Task] = None
+        # Created on first use so the hub binds to the loop it's used from
+        self.lock: Optional[asyncio.Lock] = None
+        self.dropped = 0
+        self.write_timeouts = 0
+        self.slow_disconnects = 0
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[SendQueue]:
+        """ Queue receiving the messages published to the channel for as long as the context is open """
+        queue = SendQueue(self.queue_size, self.overflow_policy)
+        await self.add_listener(channel, queue)
+        try:
+            yield queue
+        finally:
+            await self.remove_listener(channel, queue)
+            if queue.dropped:
+                logger.info("Dropped %s messages of a slow listener on %s", queue.dropped, channel)
+
+    async def send_messages(self, queue: SendQueue, send: Callable[[str], Awaitable]):
+        """ Send the queued messages until the connection closes, raising SlowConsumer when it can't keep up """
+        try:
+            while True:
+                message = await queue.get()
+                try:
+                    await asyncio.wait_for(send(message), self.write_timeout)
+                except asyncio.TimeoutError:
+                    self.write_timeouts += 1
+                    raise SlowConsumer("Write timed out")
+        except SlowConsumer:
+            self.slow_disconnects += 1
+            raise
+
+    async def add_listener(self, channel: str, queue: SendQueue):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        # Subscribes and unsubscribes are serialized, so a channel is never left subscribed without listeners
+        async with self.lock:
+            listeners = self.listeners.get(channel)
+            if listeners is None:
+                if self.pubsub is None:
+                    self.pubsub = self.redis.pubsub()
+                await self.pubsub.subscribe(channel)
+                listeners = self.listeners[channel] = set()
+            listeners.add(queue)
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.create_task(self.read_messages())
+
+    async def remove_listener(self, channel: str, queue: SendQueue):
+        async with self.lock:
+            listeners = self.listeners.get(channel)
+            if listeners is None:
+                return
+            listeners.discard(queue)
+            if not listeners:
+                del self.listeners[channel]
+                try:
+                    await self.pubsub.unsubscribe(channel)
+                except redis.RedisError as e:
+                    # The subscription is dropped with the connection, and isn't restored on reconnect
+                    logger.warning("Failed to unsubscribe from %s: %s", channel, e)
+
+    async def read_messages(self):
+        """ Read every message of the shared connection and hand it to the listeners of its channel """
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The pubsub reconnects and subscribes to its channels again on the next read
+                logger.warning("Notification hub read failed, retrying in %ss: %s", self.reconnect_delay, e)
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            for queue in self.listeners.get(message["channel"], ()):
+                self.dropped += queue.put(message["data"])
+
+    def stats(self) -> dict:
+        depths = [len(queue) for listeners in self.listeners.values() for queue in listeners]
+        return {
+            "channels": len(self.listeners),
+            "listeners": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped": self.dropped,
+            "write_timeouts": self.write_timeouts,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+        self.listeners.clear()
+
+# Hub of the process, shared by every websocket connection
+notification_hub = NotificationHub(
+    redis_client,
+    queue_size=get_settings().WEBSOCKET_SEND_QUEUE_SIZE,
+    overflow_policy=get_settings().WEBSOCKET_OVERFLOW_POLICY,
+    write_timeout=get_settings().WEBSOCKET_WRITE_TIMEOUT_SECONDS,
+)
@@ -1,25 +1,34 @@
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional
 from fastapi import WebSocket, HTTPException
 from app.core.config import get_settings
-from temporalio.client import Client
+from app.services.temporal_service import get_temporal_client
 import uuid
-from sqlalchemy.orm import Session
+import logging
+import redis.asyncio as redis
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import select, union, and_, or_, bindparam
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.workers.temporal.workflows.app_notifications_workflow import AppNotificationsWorkflow
 from app.db import models
-import redis.asyncio as redis
-
-# Create a redis connection pool
-redis_pool = redis.ConnectionPool(host=get_settings().REDIS_HOST, 
-                                  port=get_settings().REDIS_PORT, 
-                                  db=0, decode_responses=True)
+from app.services.redis_service import redis_pool, redis_client
+from app.db.session import AsyncSessionLocal, ReadAsyncSessionLocal
 
-# Create a redis client
-redis_client = redis.Redis(connection_pool=redis_pool)
+logger = logging.getLogger(__name__)
 
-async def create_temporal_client():
-    return await Client.connect(get_settings().TEMPORAL_URL)
+# Sqlite stores CURRENT_TIMESTAMP without microseconds, cursor values are bound in the same format
+# so that the keyset comparisons on created_at stay exact
+CURSOR_TIMESTAMP = TIMESTAMP().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
 
-async def start_app_notifications_workflow(topics: List[dict], message: str, db: Session):
+async def start_app_notifications_workflow(topics: List[dict], message: str):
+    """
+    Store the notification and hand it to the notification workflow without waiting for it to be delivered.
+    In the direct dispatch mode the message is published to redis right away, and the workflow is only
+    started as the durable retry path when the publish fails.
+    """
     # get the user id and team id to insert into database
     user_id = next((d["user_id"] for d in topics if "user_id" in d), None)
     team_id = next((d["team_id"] for d in topics if "team_id" in d), None)
@@ -30,25 +39,122 @@ async def start_app_notifications_workflow(topics: List[dict], message: str, db:
     # Basic validation
     if not topics_str or not message:
         raise ValueError("Both topics and message are required")
-    
-    task_id = uuid.uuid4().hex
-    client = await create_temporal_client()
-    
-    app_notification_workflow = await client.execute_workflow(
+
+    # Runs as a background task after the response, so it can't use the request's session
+    async with AsyncSessionLocal() as db:
+        db.add(models.Notifications(user_id=user_id, team_id=team_id, message=message))
+        await db.commit()
+
+    if get_settings().NOTIFICATION_DISPATCH_MODE == "direct":
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for topic in topics_str.split(","):
+                    pipe.publish(topic, message)
+                await pipe.execute()
+            return None
+        except redis.RedisError as e:
+            logger.warning("Direct notification publish failed, falling back to the workflow: %s", e)
+
+    client = await get_temporal_client()
+    return await client.start_workflow(
         AppNotificationsWorkflow.run,
-        id=task_id,
+        id=uuid.uuid4().hex,
         task_queue="app-notification-task-queue",
-        args=[topics_str, message]  # Pass as simple strings
+        args=[
+            topics_str, message,  # Pass as simple strings
+            get_settings().NOTIFICATION_FANOUT_CHUNK_SIZE, get_settings().NOTIFICATION_FANOUT_CONCURRENCY
+        ]
     )
-    # Create a model to insert into notifications table
-    notifications = models.Notifications(user_id=user_id, team_id=team_id, message=message)
-    db.add(notifications)
-    db.commit()
-    
-    return app_notification_workflow
 
 async def get_token_from_websocket(websocket: WebSocket) -> str:
     auth_header = websocket.headers.get('authorization')
     if auth_header and auth_header.startswith('Bearer '):
         return auth_header.split(' ')[1]
     raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+
+def encode_notification_cursor(created_at: datetime, notification_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{notification_id}".encode()).decode()
+
+def decode_notification_cursor(cursor: str):
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_notifications_page(
+    db: AsyncSession, user_id: int, team_id: int, limit: int,
+    before: Optional[str] = None, after: Optional[str] = None
+):
+    """
+    Keyset page of the notifications of a user and their team, newest first.
+    Each side of the OR is read from its own (user_id / team_id, created_at) index and limited before merging,
+    so the cost of a page doesnt grow with the size of the table.
+    """
+    columns = [
+        models.Notifications.id, models.Notifications.user_id, models.Notifications.team_id,
+        models.Notifications.message, models.Notifications.created_at
+    ]
+    newest_first = after is None
+    if newest_first:
+        order_by = [models.Notifications.created_at.desc(), models.Notifications.id.desc()]
+    else:
+        order_by = [models.Notifications.created_at.asc(), models.Notifications.id.asc()]
+
+    # Only fetch the rows on the far side of the cursor
+    cursor_filter = []
+    if before is not None or after is not None:
+        created_at, notification_id = decode_notification_cursor(before if newest_first else after)
+        created_at = bindparam("cursor_created_at", created_at, type_=CURSOR_TIMESTAMP, unique=True)
+        if newest_first:
+            cursor_filter.append(or_(
+                models.Notifications.created_at < created_at,
+                and_(models.Notifications.created_at == created_at, models.Notifications.id < notification_id)
+            ))
+        else:
+            cursor_filter.append(or_(
+                models.Notifications.created_at > created_at,
+                and_(models.Notifications.created_at == created_at, models.Notifications.id > notification_id)
+            ))
+
+    user_page = select(*columns).where(models.Notifications.user_id == user_id, *cursor_filter).order_by(*order_by).limit(limit).subquery()
+    team_page = select(*columns).where(models.Notifications.team_id == team_id, *cursor_filter).order_by(*order_by).limit(limit).subquery()
+    merged = union(select(user_page), select(team_page)).subquery()
+    if newest_first:
+        merged_order_by = [merged.c.created_at.desc(), merged.c.id.desc()]
+    else:
+        merged_order_by = [merged.c.created_at.asc(), merged.c.id.asc()]
+
+    rows = (await db.execute(select(merged).order_by(*merged_order_by).limit(limit))).all()
+    # Pages are always returned newest first
+    if not newest_first:
+        rows.reverse()
+    return rows
+
+def build_notifications_page(rows, limit: int, before: Optional[str] = None, after: Optional[str] = None) -> dict:
+    notifications = [row._asdict() for row in rows]
+    is_full = len(rows) == limit
+    # Older rows can exist when this page is full or when it was read towards the newer side
+    has_older = is_full if after is None else bool(rows)
+    has_newer = is_full if after is not None else (before is not None and bool(rows))
+    return {
+        "notifications": notifications,
+        "next_cursor": encode_notification_cursor(rows[-1].created_at, rows[-1].id) if has_older else None,
+        "prev_cursor": encode_notification_cursor(rows[0].created_at, rows[0].id) if has_newer else None,
+    }
+
+async def stream_notifications(user_id: int, team_id: int, batch_size: int = 1000) -> AsyncIterator[str]:
+    """ NDJSON export of every notification, read in keyset batches so memory stays bounded """
+    before = None
+    while True:
+        # Every batch uses a short lived session instead of holding a connection for the whole export
+        async with ReadAsyncSessionLocal() as db:
+            rows = await fetch_notifications_page(db, user_id, team_id, batch_size, before=before)
+        for row in rows:
+            notification = row._asdict()
+            notification["created_at"] = notification["created_at"].isoformat() if notification["created_at"] else None
+            yield json.dumps(notification) + "\n"
+        if len(rows) < batch_size:
+            break
+        before = encode_notification_cursor(rows[-1].created_at, rows[-1].id)
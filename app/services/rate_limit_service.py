@@ -0,0 +1,86 @@
+import logging
+from typing import List, NamedTuple
+import redis.asyncio as redis
+from fastapi import HTTPException
+from app.core.config import get_settings
+from app.services.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Refills every bucket by the time passed since its last update, then takes a token from all of them or from none.
+# Uses the redis clock so every api instance agrees on the time, and returns how long to wait when a bucket is empty.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * refill_rate)
+    tokens[i] = available
+    if available < 1 then
+        retry_after = math.max(retry_after, (1 - available) / refill_rate)
+    end
+end
+
+if retry_after > 0 then
+    return {0, tostring(retry_after)}
+end
+
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'updated_at', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / refill_rate))
+end
+return {1, '0'}
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+class RateLimit(NamedTuple):
+    # Requests allowed in a burst, refilled evenly over the period
+    capacity: int
+    period_seconds: int
+
+    @classmethod
+    def parse(cls, limit: str) -> "RateLimit":
+        """ Parse a limit such as "10/minute" """
+        capacity, period = limit.split("/")
+        return cls(int(capacity), PERIODS[period.strip()])
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period_seconds
+
+# Limits of every rate limited route, each client ip and each user get a bucket of their own
+RATE_LIMITS = {
+    "login": RateLimit.parse(get_settings().RATE_LIMIT_LOGIN),
+    "forget_password": RateLimit.parse(get_settings().RATE_LIMIT_FORGET_PASSWORD),
+    "verify_otp": RateLimit.parse(get_settings().RATE_LIMIT_VERIFY_OTP),
+    "invite": RateLimit.parse(get_settings().RATE_LIMIT_INVITE),
+}
+
+token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+async def check_rate_limit(route: str, identities: List[str]):
+    """ Take a token from the bucket of every identity, raising a 429 when any of them is empty """
+    if not get_settings().RATE_LIMIT_ENABLED:
+        return
+    limit = RATE_LIMITS[route]
+    keys = [f"ratelimit:{route}:{identity}" for identity in identities]
+    try:
+        allowed, retry_after = await token_bucket(keys=keys, args=[limit.capacity, limit.refill_rate])
+    except redis.RedisError as e:
+        # Let the request through rather than fail every request while redis is down
+        logger.warning("Rate limit check failed for %s: %s", route, e)
+        return
+    if not int(allowed):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, round(float(retry_after))))}
+        )
@@ -0,0 +1,10 @@
+from app.core.config import get_settings
+import redis.asyncio as redis
+
+# Create a redis connection pool
+redis_pool = redis.ConnectionPool(host=get_settings().REDIS_HOST, 
+                                  port=get_settings().REDIS_PORT, 
+                                  db=0, decode_responses=True)
+
+# Create a redis client
+redis_client = redis.Redis(connection_pool=redis_pool)
\ No newline at end of file
@@ -1,31 +1,78 @@
-from sqlalchemy.orm import Session
+from typing import NamedTuple, Optional
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import models
-from fastapi import HTTPException
-
-def get_user_role(user_id: int, team_id: int, db: Session):
-    # Check if the user already exists
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if team exists
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if not team:
+from app.core.config import get_settings
+from app.services.cache_service import TwoLevelCache
+from app.services.redis_service import redis_client
+from fastapi import HTTPException, Request
+
+# Cache of (user_id, team_id) -> role and team name, only members are cached
+role_cache = TwoLevelCache(
+    "role",
+    ttl=get_settings().ROLE_CACHE_TTL_SECONDS,
+    local_ttl=get_settings().ROLE_CACHE_LOCAL_TTL_SECONDS,
+    local_maxsize=get_settings().ROLE_CACHE_LOCAL_MAXSIZE,
+    redis_client=redis_client,
+)
+
+class TeamContext(NamedTuple):
+    team: models.Team
+    # None when the user is not a member of the team
+    membership: Optional[models.Membership]
+
+    @property
+    def is_admin(self) -> bool:
+        return self.membership is not None and self.membership.role == models.Role.ADMIN
+
+async def get_team_context(user_id: int, team_id: int, db: AsyncSession, request: Optional[Request] = None) -> TeamContext:
+    """ Resolve the team and the membership of the user in a single query, cached on the request """
+    cache = None
+    if request is not None:
+        if not hasattr(request.state, "team_contexts"):
+            request.state.team_contexts = {}
+        cache = request.state.team_contexts
+        if (user_id, team_id) in cache:
+            return cache[(user_id, team_id)]
+
+    # Get the team along with the membership of the user if there is one
+    row = (await db.execute(
+        select(models.Team, models.Membership)
+        .outerjoin(models.Membership, and_(
+            models.Membership.team_id == models.Team.id,
+            models.Membership.user_id == user_id
+        ))
+        .where(models.Team.id == team_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Team not found")
 
+    team_context = TeamContext(team=row.Team, membership=row.Membership)
+    if cache is not None:
+        cache[(user_id, team_id)] = team_context
+    return team_context
+
+def get_member_role(team_context: TeamContext):
     # Check if the user is a member of the team
-    is_member = db.query(models.Membership).filter(
-        models.Membership.user_id == user_id,
-        models.Membership.team_id == team_id
-    ).first()
-    if not is_member:
+    if not team_context.membership:
         raise HTTPException(status_code=400, detail="User is not a member of this team")
-    
-    # Get the role of the user 
-    user_role = db.query(models.Membership).filter(
-        models.Membership.user_id == user_id,
-        models.Membership.team_id == team_id
-    ).first()
 
     # Return the role of the user
-    return user_role.role, team.name
\ No newline at end of file
+    return team_context.membership.role, team_context.team.name
+
+async def get_user_role(user_id: int, team_id: int, db: AsyncSession, request: Optional[Request] = None):
+    # Serve the role from the cache when possible
+    cached_role = await role_cache.get(f"{user_id}:{team_id}")
+    if cached_role is not None:
+        return models.Role(cached_role["role"]), cached_role["team_name"]
+
+    # Taken before the membership is read, so a role changed while it's read isn't cached
+    generation = await role_cache.generation(f"{user_id}:{team_id}")
+    team_context = await get_team_context(user_id, team_id, db, request)
+    user_role, team_name = get_member_role(team_context)
+    await role_cache.set(f"{user_id}:{team_id}", {"role": user_role.value, "team_name": team_name}, generation=generation)
+    return user_role, team_name
+
+async def invalidate_user_role(user_id: int, team_id: int):
+    """ Must be called after every commit which adds, removes or changes a membership """
+    await role_cache.delete(f"{user_id}:{team_id}")
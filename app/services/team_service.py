@@ -1,9 +1,24 @@
-from app.services.mail.mail_service import mail, create_message
+from app.services.mail.mail_service import mail, create_message, start_batch_email_workflow
+from app.services.auth_service import create_url_safe_token
+from app.core.config import get_settings
 from app.db import models
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import EmailStr, TypeAdapter, ValidationError
 from app.api.v1.schemas.team import UpdateUserRole
+from app.services.role_service import TeamContext, invalidate_user_role
+from datetime import datetime
+from typing import List
 import secrets
+import csv
+import io
+
+# Number of values bound per IN query, well below the sqlite variable limit
+IN_QUERY_CHUNK_SIZE = 500
+
+email_adapter = TypeAdapter(EmailStr)
 
 async def send_team_invitation(email: str, subject: str, html_content: str):
     try:
@@ -15,25 +30,15 @@ async def send_team_invitation(email: str, subject: str, html_content: str):
 def generate_team_code() -> str:
     return secrets.token_hex(2).upper()
 
-def fetch_all_teammates_from_database(user_id: int, team_id: int, db: Session):
-    # Check wheather the team exist or not
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="team does not exist")
-    
+async def fetch_all_teammates_from_database(team_context: TeamContext, db: AsyncSession):
     # Check if the user is a member of the team
-    is_member = db.query(models.Membership).filter(
-        models.Membership.user_id == user_id,
-        models.Membership.team_id == team_id
-    ).first()
-    print(is_member)
-    if not is_member:
+    if not team_context.membership:
         raise HTTPException(status_code=403, detail="User doesnt have access to view team members")
     
     # Get all the team members 
-    team_members = db.query(models.Membership, models.User).join(
+    team_members = (await db.execute(select(models.Membership, models.User).join(
         models.User, models.User.id == models.Membership.user_id
-    ).filter(models.Membership.team_id == team_id).all()
+    ).where(models.Membership.team_id == team_context.team.id))).all()
 
     members_info = [
         {
@@ -46,59 +51,136 @@ def fetch_all_teammates_from_database(user_id: int, team_id: int, db: Session):
     ]
     return members_info
 
-def change_user_role(user_id: int, team_id: int, current_user_id: int, role_update: UpdateUserRole, db: Session):
-    # Check if the team exists
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="Team does not exist")
-
-    # Check if the user exists
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User does not exist")
+async def change_user_role(user_id: int, team_context: TeamContext, role_update: UpdateUserRole, db: AsyncSession):
+    # Check if the current user is an admin of the team
+    if not team_context.is_admin:
+        raise HTTPException(status_code=403, detail="You do not have permission to update roles in this team")
 
     # Check if the user is a member of the team
-    membership = db.query(models.Membership).filter(
-        models.Membership.user_id == user_id,
-        models.Membership.team_id == team_id
-    ).first()
+    membership = team_context.membership
+    if membership.user_id != user_id:
+        membership = await db.scalar(select(models.Membership).where(
+            models.Membership.user_id == user_id,
+            models.Membership.team_id == team_context.team.id
+        ))
     if not membership:
         raise HTTPException(status_code=400, detail="User is not a member of this team")
     
-    # Check if the current user is an admin of the team
-    is_admin = db.query(models.Membership).filter(
-        models.Membership.user_id == current_user_id,
-        models.Membership.team_id == team_id,
-        models.Membership.role == models.Role.ADMIN,
-    ).first()
-    if not is_admin:
-        raise HTTPException(status_code=403, detail="You do not have permission to update roles in this team")
-    
     # # Update the user's role
     membership.role = role_update.role
-    db.commit()
+    await db.commit()
+    await invalidate_user_role(user_id, team_context.team.id)
 
     return membership
 
-def create_new_team(user_id: int, team_name: str, db: Session):
+async def create_new_team(user_id: int, team_name: str, db: AsyncSession):
     # Check if the user creating team is a valid user.
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.scalar(select(models.User).where(models.User.id == user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     # Check if the user has already created a team
-    existing_team = db.query(models.Membership).filter(models.Membership.user_id == user_id, models.Membership.role == models.Role.ADMIN).first()
+    existing_team = await db.scalar(select(models.Membership).where(models.Membership.user_id == user_id, models.Membership.role == models.Role.ADMIN))
     if existing_team:
         raise HTTPException(status_code=400, detail="User can create only one team")
     # If both the condition passes allowing user to create a teams
     team_code = generate_team_code()
     new_team = models.Team(name=team_name, team_code=team_code)
     db.add(new_team)
-    db.commit()
-    db.refresh(new_team)
+    await db.commit()
+    await db.refresh(new_team)
 
     membership = models.Membership(user_id=user_id, team_id=new_team.id, role=models.Role.ADMIN)
     db.add(membership)
-    db.commit()
-    db.refresh(membership)
+    await db.commit()
+    await db.refresh(membership)
+    await invalidate_user_role(user_id, new_team.id)
+
+    return new_team
+
+def parse_email_list(content: bytes):
+    """ Read the emails out of an uploaded csv or plain text file, cells without an @ such as headers are ignored """
+    emails = []
+    invalid_emails = []
+    for row in csv.reader(io.StringIO(content.decode("utf-8-sig"))):
+        for cell in row:
+            cell = cell.strip()
+            if "@" not in cell:
+                continue
+            try:
+                emails.append(email_adapter.validate_python(cell))
+            except ValidationError:
+                invalid_emails.append(cell)
+    return emails, invalid_emails
+
+async def invite_members_to_team(emails: List[str], team_context: TeamContext, db: AsyncSession):
+    """ Invite all the emails in a single transaction, returning the invited emails and the skipped ones with a reason """
+    # Check if the current user is the admin of the team
+    if not team_context.is_admin:
+        raise HTTPException(status_code=403, detail="User doesn't have access to invite members to the team")
+
+    if len(emails) > get_settings().INVITE_MAX_EMAILS:
+        raise HTTPException(status_code=413, detail=f"At most {get_settings().INVITE_MAX_EMAILS} emails can be invited at once")
+
+    team_id = team_context.team.id
+    unique_emails = list(dict.fromkeys(emails))
+
+    # Find the emails which are already members or already invited, a chunk of emails at a time
+    members = set()
+    already_invited = set()
+    for start in range(0, len(unique_emails), IN_QUERY_CHUNK_SIZE):
+        chunk = unique_emails[start:start + IN_QUERY_CHUNK_SIZE]
+        members.update(await db.scalars(
+            select(models.User.email)
+            .join(models.Membership, models.Membership.user_id == models.User.id)
+            .where(models.Membership.team_id == team_id, models.User.email.in_(chunk))
+        ))
+        already_invited.update(await db.scalars(
+            select(models.Invitations.invited_user_email)
+            .where(models.Invitations.team_id == team_id, models.Invitations.invited_user_email.in_(chunk))
+        ))
+
+    invited_users = []
+    skipped_users = []
+    for email in emails:
+        if email in members:
+            skipped_users.append({"email": email, "reason": "Already a team member"})
+        elif email in already_invited:
+            skipped_users.append({"email": email, "reason": "Invitation already sent"})
+        else:
+            invited_users.append(email)
+            # Later duplicates in the list are skipped as already invited
+            already_invited.add(email)
+
+    # Add all the invitations in one transaction
+    if invited_users:
+        await db.execute(insert(models.Invitations), [
+            {"team_id": team_id, "invited_user_email": email} for email in invited_users
+        ])
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Some of the emails were invited at the same time, please try again")
+
+    return invited_users, skipped_users
+
+async def send_team_invitations(emails: List[str], team: models.Team):
+    """ Send the invitation emails of a team from a single batched email workflow """
+    recipients = []
+    for email in emails:
+        # Generate a unique invite token for each user
+        token = create_url_safe_token(
+            {"email": email, "created_at": datetime.utcnow().timestamp(),
+            "team_code": team.team_code}
+        )
+        recipients.append({
+            "email": email,
+            "user_email": email,
+            "username": email.split("@")[0],
+            "invitation_link": f"http://{get_settings().DOMAIN}/v1/teams/join_team/{token}",
+        })
 
-    return new_team
\ No newline at end of file
+    await start_batch_email_workflow(
+        "invitation_mail.html", f"You are invited To Join {team.name}!",
+        {"team_name": team.name}, recipients
+    )
@@ -0,0 +1,28 @@
+import asyncio
+from typing import Optional
+from temporalio.client import Client
+from app.core.config import get_settings
+
+# One client per process, shared by the api and the workers. The client reconnects on its own
+# and keeps the connection alive, so it's only replaced when the first connect fails.
+temporal_client: Optional[Client] = None
+connect_lock: Optional[asyncio.Lock] = None
+
+async def get_temporal_client() -> Client:
+    """ Return the shared temporal client, connecting on first use """
+    global temporal_client, connect_lock
+    if temporal_client is not None:
+        return temporal_client
+
+    if connect_lock is None:
+        connect_lock = asyncio.Lock()
+    # Concurrent first calls wait for a single connect instead of each opening a connection
+    async with connect_lock:
+        if temporal_client is None:
+            temporal_client = await Client.connect(get_settings().TEMPORAL_URL)
+    return temporal_client
+
+def set_temporal_client(client: Optional[Client]):
+    """ Replace the shared client, tests use it to inject a client of a test server or a mock """
+    global temporal_client
+    temporal_client = client
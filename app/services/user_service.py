@@ -1,28 +1,47 @@
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from app.services.hashing_service import verify_secret
+from app.core.config import get_settings
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from datetime import datetime
 from app.db import models
 import string
-import random
+import secrets
+import hmac
+import hashlib
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+# Prefix of otps hashed with the hmac, older rows hold bcrypt hashes
+OTP_HASH_PREFIX = "hmac-sha256$"
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+# Use a key of its own so the otp hashes don't share a key with the tokens
+OTP_HMAC_KEY = (
+    get_settings().OTP_HMAC_SECRET.encode() if get_settings().OTP_HMAC_SECRET
+    else hmac.new(get_settings().SECRET_KEY.encode(), b"password-reset-otp", hashlib.sha256).digest()
+)
+
+def hash_otp(user_id: int, otp: str) -> str:
+    """ Otps are short lived and attempt limited, so a keyed hash is enough and bcrypt's cost isn't needed """
+    digest = hmac.new(OTP_HMAC_KEY, f"{user_id}:{otp}".encode(), hashlib.sha256).hexdigest()
+    return OTP_HASH_PREFIX + digest
+
+async def verify_otp_hash(user_id: int, otp: str, hashed_otp: str) -> bool:
+    if hashed_otp.startswith(OTP_HASH_PREFIX):
+        return hmac.compare_digest(hash_otp(user_id, otp), hashed_otp)
+    # Rows created before the hmac are still bcrypt hashes until they expire
+    return await verify_secret(otp, hashed_otp)
 
 def generate_otp(length: int = 6) -> str:
     """Generate a random OTP"""
-    return ''.join(random.choices(string.digits, k=length))
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
 
-def create_new_otp(db: Session, user_id: int, expiry_minutes: int = 10):
+async def create_new_otp(db: AsyncSession, user_id: int, expiry_minutes: int = 10):
     # Invalidate all existing OTPs
-    db.query(models.PasswordResetOTP).filter(
+    await db.execute(update(models.PasswordResetOTP).where(
         models.PasswordResetOTP.user_id == user_id,
         models.PasswordResetOTP.is_valid == True
-    ).update({
+    ).values({
         "is_valid": False
-    })
+    }))
 
     # Genearte 6 digit random otp
     otp = generate_otp()
@@ -30,22 +49,22 @@ def create_new_otp(db: Session, user_id: int, expiry_minutes: int = 10):
     # Create new OTP record
     new_otp = models.PasswordResetOTP(
         user_id=user_id,
-        hashed_otp=pwd_context.hash(str(otp)),
+        hashed_otp=hash_otp(user_id, otp),
         expires_at=datetime.utcnow() + timedelta(minutes=expiry_minutes)
     )
 
     # Add the otp to the database
     db.add(new_otp)
-    db.commit()
+    await db.commit()
     return otp
 
-def validate_otp(db: Session, user_id: int, otp: str):
-    valid_otp = db.query(models.PasswordResetOTP).filter(
+async def validate_otp(db: AsyncSession, user_id: int, otp: str):
+    valid_otp = await db.scalar(select(models.PasswordResetOTP).where(
         models.PasswordResetOTP.user_id == user_id,
         models.PasswordResetOTP.is_valid == True,
         models.PasswordResetOTP.expires_at > datetime.utcnow(),
         models.PasswordResetOTP.used_at.is_(None)
-    ).first()
+    ))
 
     if not valid_otp:
         return {"error": "Invalid or expired OTP"}
@@ -53,13 +72,13 @@ def validate_otp(db: Session, user_id: int, otp: str):
     if valid_otp.attempts >= valid_otp.max_attempts:
         return {"error": "Too many failed attempts, please request a new OTP"}
 
-    if not pwd_context.verify(otp, valid_otp.hashed_otp):
+    if not await verify_otp_hash(user_id, otp, valid_otp.hashed_otp):
         valid_otp.attempts += 1
-        db.commit()
+        await db.commit()
         return {"error": "Invalid OTP"}
 
     # Reset attempts if OTP is correct
     valid_otp.attempts = 0
-    db.commit()
+    await db.commit()
     
     return {"success": valid_otp}
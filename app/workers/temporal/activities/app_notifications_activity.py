@@ -1,7 +1,17 @@
 from temporalio import activity
+from typing import List
 from app.services.notification_service import redis_client
 
 @activity.defn
 async def send_app_notifications_to_user(topic: str , message: str):
     await redis_client.publish(topic, message)
-    return message
\ No newline at end of file
+    return message
+
+@activity.defn
+async def send_app_notifications_batch(notifications: List[List[str]]):
+    """ Publish every (topic, message) pair in a single redis round trip, returning the topics published to """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for topic, message in notifications:
+            pipe.publish(topic, message)
+        await pipe.execute()
+    return [topic for topic, _ in notifications]
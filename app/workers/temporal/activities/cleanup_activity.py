@@ -0,0 +1,56 @@
+from datetime import datetime
+from temporalio import activity
+from sqlalchemy import select, delete, or_, and_, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import models
+from app.db.session import AsyncSessionLocal
+
+async def delete_in_batches(db: AsyncSession, model, condition, batch_size: int, max_batches: int):
+    """ Delete the matching rows by primary key in bounded batches, committing and reporting progress after each """
+    deleted_rows = activity.metric_meter().create_counter(
+        "cleanup_deleted_rows", "Rows deleted by the cleanup workflow"
+    ).with_additional_attributes({"table": model.__tablename__})
+    deleted = 0
+    batches = 0
+
+    while batches < max_batches:
+        ids = (await db.scalars(select(model.id).where(condition).limit(batch_size))).all()
+        if not ids:
+            break
+
+        await db.execute(delete(model).where(model.id.in_(ids)))
+        await db.commit()
+
+        deleted += len(ids)
+        batches += 1
+        deleted_rows.add(len(ids))
+        activity.heartbeat(deleted)
+        activity.logger.info(f"Deleted {deleted} rows from {model.__tablename__}")
+        if len(ids) < batch_size:
+            break
+
+    return {"deleted": deleted, "batches": batches}
+
+@activity.defn
+async def delete_expired_otps(now: str, batch_size: int, max_batches: int):
+    """ Otps which expired, were used, or were replaced by a newer otp can never be validated again """
+    async with AsyncSessionLocal() as db:
+        return await delete_in_batches(db, models.PasswordResetOTP, or_(
+            models.PasswordResetOTP.expires_at < datetime.fromisoformat(now),
+            models.PasswordResetOTP.used_at.is_not(None),
+            models.PasswordResetOTP.is_valid == False
+        ), batch_size, max_batches)
+
+@activity.defn
+async def delete_expired_invitations(cutoff: str, batch_size: int, max_batches: int):
+    """ Invitations which were never accepted before the cutoff, accepted ones are kept as they guard rejoining """
+    async with AsyncSessionLocal() as db:
+        is_accepted = exists().where(
+            models.Membership.team_id == models.Invitations.team_id,
+            models.Membership.user_id == models.User.id,
+            models.User.email == models.Invitations.invited_user_email
+        )
+        return await delete_in_batches(db, models.Invitations, and_(
+            models.Invitations.created_at < datetime.fromisoformat(cutoff),
+            ~is_accepted
+        ), batch_size, max_batches)
@@ -2,10 +2,36 @@
 from temporalio import activity
 import json
 from app.services.vault_service import get_secret
-from sqlalchemy.orm import Session
+from app.db import models
+from app.db.session import AsyncSessionLocal
 
 @activity.defn
-async def create_bucket(team_name: str, bucket_name: str, team_id: int, db: Session):
+async def create_bucket(team_name: str, bucket_name: str, team_id: int):
+    result = await create_team_bucket(team_name, bucket_name, team_id)
+
+    # Mark the request as done so it leaves the approved requests, the activity opens its own session
+    # as a database session can't be passed in through the workflow
+    from app.services.minio_service import set_bucket_request_status
+    status = models.BucketRequestStatus.COMPLETED if result["success"] else models.BucketRequestStatus.FAILED
+    async with AsyncSessionLocal() as db:
+        await set_bucket_request_status(
+            activity.info().workflow_id, status, db, from_statuses=[models.BucketRequestStatus.APPROVED]
+        )
+        await db.commit()
+    return result
+
+@activity.defn
+async def expire_bucket_request():
+    # Only a request nobody decided on expires, a decision racing the timeout keeps its status
+    from app.services.minio_service import set_bucket_request_status
+    async with AsyncSessionLocal() as db:
+        await set_bucket_request_status(
+            activity.info().workflow_id, models.BucketRequestStatus.EXPIRED, db,
+            from_statuses=[models.BucketRequestStatus.PENDING]
+        )
+        await db.commit()
+
+async def create_team_bucket(team_name: str, bucket_name: str, team_id: int):
     try:
         from app.services.minio_service import check_bucket_exist, create_minio_bucket
         # Get the secret credentials from the vault
@@ -18,7 +44,7 @@ async def create_bucket(team_name: str, bucket_name: str, team_id: int, db: Sess
             return {"success": False, "message": "Bucket already exists!"}
         
         # Create a new bucket
-        await create_minio_bucket(team_id, bucket_name, parsed_credentials, db)  # Use differently named function
+        await create_minio_bucket(team_id, bucket_name, parsed_credentials)  # Use differently named function
         return {"success": True, "message": f"Bucket {bucket_name} created successfully!"}
     except Exception as e:
         # Handle errors and return a structured response
@@ -0,0 +1,55 @@
+from datetime import datetime
+from temporalio import activity
+from sqlalchemy import select, insert, delete, text
+from app.db import models
+from app.db.session import AsyncSessionLocal, async_engine, is_sqlite, DATABASE_URL
+
+@activity.defn
+async def archive_notifications(cutoff: str, batch_size: int, max_batches: int):
+    """ Move notifications older than the cutoff into the archive table, one bounded transaction per batch """
+    cutoff_at = datetime.fromisoformat(cutoff)
+    archived = 0
+    batches = 0
+
+    async with AsyncSessionLocal() as db:
+        while batches < max_batches:
+            # Oldest first so every batch walks the created_at index
+            ids = (await db.scalars(
+                select(models.Notifications.id)
+                .where(models.Notifications.created_at < cutoff_at)
+                .order_by(models.Notifications.created_at)
+                .limit(batch_size)
+            )).all()
+            if not ids:
+                break
+
+            columns = ["id", "user_id", "team_id", "message", "created_at"]
+            await db.execute(
+                insert(models.NotificationsArchive).from_select(
+                    columns,
+                    select(*[getattr(models.Notifications, column) for column in columns])
+                    .where(models.Notifications.id.in_(ids))
+                )
+            )
+            await db.execute(delete(models.Notifications).where(models.Notifications.id.in_(ids)))
+            await db.commit()
+
+            archived += len(ids)
+            batches += 1
+            activity.heartbeat(archived)
+            if len(ids) < batch_size:
+                break
+
+    return {"archived": archived, "batches": batches}
+
+@activity.defn
+async def vacuum_notifications():
+    """ Return the pages freed by archiving to the filesystem, postgres autovacuum handles this itself """
+    if not is_sqlite(DATABASE_URL):
+        return 0
+    async with async_engine.connect() as connection:
+        freelist_count = await connection.scalar(text("PRAGMA freelist_count"))
+        # The pragma frees one page per step, executescript steps it to completion unlike execute
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+        return freelist_count - await connection.scalar(text("PRAGMA freelist_count"))
@@ -1,8 +1,27 @@
 from temporalio import activity
-from app.services.mail.mail_service import dispatch_verification_email
+from typing import List
+from app.services.mail.mail_service import dispatch_verification_email, smtp_pool
+from app.services.mail.template_service import render_emails_async
 
 @activity.defn
 async def handle_email_workflow(email_address: str, subject: str, html_content: str):
     await dispatch_verification_email(email_address, subject, html_content)
     print(f"Email sent to user : {email_address} with subject: {subject}")
-    return f"user email received at activity : {email_address}"
\ No newline at end of file
+    return f"user email received at activity : {email_address}"
+
+@activity.defn
+async def send_emails(email_addresses: List[str], subject: str, html_content: str):
+    """ Send the same email to each address over one pooled smtp connection, returning whether each was sent """
+    return await smtp_pool.send_emails([
+        {"email": email_address, "subject": subject, "html_content": html_content}
+        for email_address in email_addresses
+    ])
+
+@activity.defn
+async def send_batch_emails(template_name: str, subject: str, context: dict, recipients: List[dict]):
+    """ Render and send the template to each recipient over one pooled smtp connection, returning whether each was sent """
+    html_contents = await render_emails_async(template_name, context, recipients)
+    return await smtp_pool.send_emails([
+        {"email": recipient["email"], "subject": subject, "html_content": html_content}
+        for recipient, html_content in zip(recipients, html_contents)
+    ])
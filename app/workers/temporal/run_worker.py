@@ -1,9 +1,73 @@
+"""
+Runs the temporal workers. Without arguments one worker per queue runs in this process,
+otherwise every queue=N argument starts N worker processes for that queue.
+
+    python -m app.workers.temporal.run_worker email=4 bucket=2
+"""
+import argparse
 import asyncio
-from .worker_manager import email_worker, notification_worker, create_bucket_worker
+import multiprocessing
+import multiprocessing.connection
+import sys
+from typing import Dict
+from .worker_manager import WORKERS
 
 async def run_worker():
     print("Starting Workers .....")
-    await asyncio.gather(notification_worker(), email_worker(), create_bucket_worker())
+    await asyncio.gather(*[worker() for worker in WORKERS.values()])
+
+def run_queue(queue: str):
+    asyncio.run(WORKERS[queue]())
+
+def run_processes(queue_counts: Dict[str, int]) -> int:
+    """ Start the worker processes and stop them all once one exits, returning the exit code """
+    # Spawned rather than forked so every process opens its own temporal client and event loop
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_queue, args=(queue,), name=f"{queue}-worker-{i}")
+        for queue, count in queue_counts.items()
+        for i in range(count)
+    ]
+    print(f"Starting {len(processes)} worker processes: {queue_counts}")
+    for process in processes:
+        process.start()
+
+    exit_code = 0
+    try:
+        # A worker exiting takes the rest down, so the process manager restarts the whole group
+        multiprocessing.connection.wait([process.sentinel for process in processes])
+        exit_code = 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+    return exit_code
+
+def parse_queue_counts(parser: argparse.ArgumentParser, values: list) -> Dict[str, int]:
+    queue_counts = {}
+    for value in values:
+        queue, _, count = value.partition("=")
+        if queue not in WORKERS:
+            parser.error(f"unknown queue {queue!r}, expected one of {', '.join(WORKERS)}")
+        if not count.isdigit() or int(count) < 1:
+            parser.error(f"expected a positive process count in {value!r}")
+        queue_counts[queue] = int(count)
+    return queue_counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queues", nargs="*", metavar="QUEUE=N", help=f"one of {', '.join(WORKERS)} and its process count")
+    args = parser.parse_args()
+
+    if not args.queues:
+        asyncio.run(run_worker())
+        return
+    sys.exit(run_processes(parse_queue_counts(parser, args.queues)))
 
 if __name__ == "__main__":
-    asyncio.run(run_worker())
\ No newline at end of file
+    main()
@@ -1,36 +1,136 @@
-from .activities.app_notifications_activity import send_app_notifications_to_user
-from .activities.user_email_activity import handle_email_workflow
-from .activities.create_bucket_activity import create_bucket
+from .activities.app_notifications_activity import send_app_notifications_to_user, send_app_notifications_batch
+from .activities.user_email_activity import handle_email_workflow, send_emails, send_batch_emails
+from .activities.create_bucket_activity import create_bucket, expire_bucket_request
+from .activities.notification_retention_activity import archive_notifications, vacuum_notifications
+from .activities.cleanup_activity import delete_expired_otps, delete_expired_invitations
 from .workflows.app_notifications_workflow import AppNotificationsWorkflow
-from .workflows.user_email_workflow import UserEmailWorkflow
+from .workflows.user_email_workflow import UserEmailWorkflow, BatchEmailWorkflow
 from .workflows.create_bucket_workflow import BucketCreationWorkFlow
-from temporalio.client import Client
+from .workflows.notification_retention_workflow import NotificationRetentionWorkflow
+from .workflows.cleanup_workflow import CleanupWorkflow
+from temporalio.client import (
+    Client, Schedule, ScheduleActionStartWorkflow, ScheduleSpec, SchedulePolicy,
+    ScheduleOverlapPolicy, ScheduleUpdate, ScheduleAlreadyRunningError
+)
 from temporalio.worker import Worker
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 from app.core.config import get_settings
+from app.services.temporal_service import get_temporal_client
+
+class WorkerLimits(NamedTuple):
+    max_concurrent_activities: int
+    max_concurrent_workflow_tasks: int
+    activity_threads: int
+
+def get_worker_limits(queue: str) -> WorkerLimits:
+    """ Limits of the given queue, read from its <QUEUE>_WORKER_* settings """
+    settings = get_settings()
+    return WorkerLimits(
+        max_concurrent_activities=getattr(settings, f"{queue.upper()}_WORKER_MAX_ACTIVITIES"),
+        max_concurrent_workflow_tasks=getattr(settings, f"{queue.upper()}_WORKER_MAX_WORKFLOW_TASKS"),
+        activity_threads=getattr(settings, f"{queue.upper()}_WORKER_ACTIVITY_THREADS"),
+    )
+
+def create_worker(
+    client: Client, queue: str, task_queue: str, workflows: list, activities: list,
+    activity_executor: ThreadPoolExecutor, **options
+) -> Worker:
+    """ Worker for the task queue with the limits of the queue, extra options are passed on to the worker """
+    limits = get_worker_limits(queue)
+    return Worker(
+        client, task_queue=task_queue,
+        workflows=workflows,
+        activities=activities,
+        activity_executor=activity_executor,
+        max_concurrent_activities=limits.max_concurrent_activities,
+        max_concurrent_workflow_tasks=limits.max_concurrent_workflow_tasks,
+        **options
+    )
+
+async def run_queue_worker(client: Client, queue: str, task_queue: str, workflows: list, activities: list):
+    """ Run a worker for the task queue with the limits of the queue until it's shut down """
+    limits = get_worker_limits(queue)
+    # Sync activities run here instead of on the event loop shared with the async ones
+    with ThreadPoolExecutor(max_workers=limits.activity_threads, thread_name_prefix=f"{queue}-activity") as activity_executor:
+        await create_worker(client, queue, task_queue, workflows, activities, activity_executor).run()
 
 async def notification_worker():
-    client = await Client.connect(get_settings().TEMPORAL_URL)
-    worker = Worker(
-        client, task_queue="app-notification-task-queue",
+    client = await get_temporal_client()
+    await run_queue_worker(
+        client, "notification", "app-notification-task-queue",
         workflows=[AppNotificationsWorkflow],
-        activities=[send_app_notifications_to_user]
+        activities=[send_app_notifications_to_user, send_app_notifications_batch]
     )
-    await worker.run()
 
 async def email_worker():
-    client = await Client.connect(get_settings().TEMPORAL_URL)
-    worker = Worker(
-        client, task_queue="user-email-task-queue",
-        workflows=[UserEmailWorkflow],
-        activities=[handle_email_workflow]
+    client = await get_temporal_client()
+    await run_queue_worker(
+        client, "email", "user-email-task-queue",
+        workflows=[UserEmailWorkflow, BatchEmailWorkflow],
+        activities=[handle_email_workflow, send_emails, send_batch_emails]
     )
-    await worker.run()
 
 async def create_bucket_worker():
-    client = await Client.connect(get_settings().TEMPORAL_URL)
-    worker = Worker(
-        client, task_queue="bucket-creation-task-queue",
+    client = await get_temporal_client()
+    await run_queue_worker(
+        client, "bucket", "bucket-creation-task-queue",
         workflows=[BucketCreationWorkFlow],
-        activities=[create_bucket]
+        activities=[create_bucket, expire_bucket_request]
     )
-    await worker.run()
\ No newline at end of file
+
+async def ensure_schedule(client: Client, schedule_id: str, schedule: Schedule):
+    """ Create the schedule, or update it in place so config changes apply on the next deploy """
+    try:
+        await client.create_schedule(schedule_id, schedule)
+    except ScheduleAlreadyRunningError:
+        await client.get_schedule_handle(schedule_id).update(lambda _: ScheduleUpdate(schedule=schedule))
+
+async def maintenance_worker():
+    settings = get_settings()
+    client = await get_temporal_client()
+
+    # Skip a run if the previous one is still going, so two runs never work on the same rows
+    await ensure_schedule(client, "notification-retention-schedule", Schedule(
+        action=ScheduleActionStartWorkflow(
+            NotificationRetentionWorkflow.run,
+            args=[
+                settings.NOTIFICATION_RETENTION_DAYS,
+                settings.NOTIFICATION_ARCHIVE_BATCH_SIZE,
+                settings.NOTIFICATION_ARCHIVE_MAX_BATCHES,
+            ],
+            id="notification-retention-workflow",
+            task_queue="maintenance-task-queue",
+        ),
+        spec=ScheduleSpec(cron_expressions=[settings.NOTIFICATION_RETENTION_CRON]),
+        policy=SchedulePolicy(overlap=ScheduleOverlapPolicy.SKIP),
+    ))
+
+    await ensure_schedule(client, "cleanup-schedule", Schedule(
+        action=ScheduleActionStartWorkflow(
+            CleanupWorkflow.run,
+            args=[
+                settings.INVITATION_EXPIRY_DAYS,
+                settings.CLEANUP_BATCH_SIZE,
+                settings.CLEANUP_MAX_BATCHES,
+            ],
+            id="cleanup-workflow",
+            task_queue="maintenance-task-queue",
+        ),
+        spec=ScheduleSpec(cron_expressions=[settings.CLEANUP_CRON]),
+        policy=SchedulePolicy(overlap=ScheduleOverlapPolicy.SKIP),
+    ))
+
+    await run_queue_worker(
+        client, "maintenance", "maintenance-task-queue",
+        workflows=[NotificationRetentionWorkflow, CleanupWorkflow],
+        activities=[archive_notifications, vacuum_notifications, delete_expired_otps, delete_expired_invitations]
+    )
+
+# Workers by the queue name used for their settings and on the run_worker command line
+WORKERS = {
+    "notification": notification_worker,
+    "email": email_worker,
+    "bucket": create_bucket_worker,
+    "maintenance": maintenance_worker,
+}
@@ -1,28 +1,51 @@
 from temporalio import workflow
 from datetime import timedelta
 from typing import List
+import asyncio
 
 @workflow.defn
 class AppNotificationsWorkflow:
     @workflow.run
-    async def run(self, topics_str: str, message: str) -> List[str]:
+    async def run(self, topics_str: str, message: str, chunk_size: int = 100, max_concurrency: int = 10) -> List[str]:
         try:
             # Split topics back into a list
             topics = [t.strip() for t in topics_str.split(",")]
-            
-            results = []
-            for topic in topics:
-                if topic:  # Skip empty topics
-                    result = await workflow.execute_activity(
-                        "send_app_notifications_to_user",
-                        args=[topic, message],  # Pass as list instead of tuple
+
+            # Workflows started before batching replay the one activity per topic fan out
+            if not workflow.patched("batched-notification-fanout"):
+                return await self.send_one_by_one(topics, message)
+
+            notifications = [[topic, message] for topic in topics if topic]
+            chunks = [notifications[start:start + chunk_size] for start in range(0, len(notifications), chunk_size)]
+
+            # Publish the chunks concurrently, with at most max_concurrency activities running at once
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def send_chunk(chunk: List[List[str]]) -> List[str]:
+                async with semaphore:
+                    return await workflow.execute_activity(
+                        "send_app_notifications_batch",
+                        args=[chunk],
                         start_to_close_timeout=timedelta(seconds=30)
                     )
-                    if result:
-                        results.append(result)
-                        
+
+            results = [topic for published in await asyncio.gather(*[send_chunk(chunk) for chunk in chunks]) for topic in published]
             return results if results else ["No notifications sent"]
             
         except Exception as e:
             workflow.logger.error(f"Workflow failed: {str(e)}")
             return [f"Error: {str(e)}"]
+
+    async def send_one_by_one(self, topics: List[str], message: str) -> List[str]:
+        results = []
+        for topic in topics:
+            if topic:  # Skip empty topics
+                result = await workflow.execute_activity(
+                    "send_app_notifications_to_user",
+                    args=[topic, message],  # Pass as list instead of tuple
+                    start_to_close_timeout=timedelta(seconds=30)
+                )
+                if result:
+                    results.append(result)
+
+        return results if results else ["No notifications sent"]
@@ -0,0 +1,34 @@
+from temporalio import workflow
+from temporalio.common import RetryPolicy
+from datetime import timedelta
+
+@workflow.defn
+class CleanupWorkflow:
+    @workflow.run
+    async def run(self, invitation_expiry_days: int, batch_size: int, max_batches: int):
+        # workflow.now is deterministic across replays
+        now = workflow.now().replace(tzinfo=None)
+        cutoffs = {
+            "delete_expired_otps": now,
+            "delete_expired_invitations": now - timedelta(days=invitation_expiry_days),
+        }
+
+        results = {}
+        for activity_name, cutoff in cutoffs.items():
+            deleted = 0
+            while True:
+                result = await workflow.execute_activity(
+                    activity_name,
+                    args=[cutoff.isoformat(), batch_size, max_batches],
+                    start_to_close_timeout=timedelta(minutes=30),
+                    heartbeat_timeout=timedelta(minutes=2),
+                    retry_policy=RetryPolicy(maximum_attempts=5),
+                )
+                deleted += result["deleted"]
+                # A partial run means every matching row has been deleted
+                if result["batches"] < max_batches:
+                    break
+            results[activity_name] = deleted
+
+        workflow.logger.info(f"Cleanup finished: {results}")
+        return results
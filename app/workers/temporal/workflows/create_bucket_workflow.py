@@ -1,6 +1,6 @@
+import asyncio
 from temporalio import workflow
 from datetime import timedelta
-from sqlalchemy.orm import Session
 
 @workflow.defn()
 class BucketCreationWorkFlow:
@@ -12,20 +12,28 @@ class BucketCreationWorkFlow:
     async def create_new_bucket(self, bucket_name: str, team_name: str, team_id: int):
         self.approval = None
 
-        # Wait for admin approval/rejection
-        while self.approval is None:
-            await workflow.wait_condition(lambda: self.approval is not None, timeout=timedelta(hours=24))
+        # Wait for admin approval/rejection, workflows started before requests expired keep the old wait
+        if not workflow.patched("expire-undecided-bucket-request"):
+            while self.approval is None:
+                await workflow.wait_condition(lambda: self.approval is not None, timeout=timedelta(hours=24))
+        else:
+            try:
+                await workflow.wait_condition(lambda: self.approval is not None, timeout=timedelta(hours=24))
+            except asyncio.TimeoutError:
+                # Nobody decided in time, expire the request so it leaves the pending requests
+                with workflow.unsafe.imports_passed_through():
+                    from ..activities.create_bucket_activity import expire_bucket_request
+                await workflow.execute_activity(expire_bucket_request, start_to_close_timeout=timedelta(seconds=30))
+                return "Bucket creation request expired"
 
         # if the request is approved by the admin then create a bucket 
         if self.approval:
             # Added passthrough as its a external https to the minio client
             with workflow.unsafe.imports_passed_through():
                 from ..activities.create_bucket_activity import create_bucket
-                from app.db.session import get_db
-                db = get_db()
                 return await workflow.execute_activity(
                     create_bucket,
-                    args=[team_name, bucket_name, team_id, db],
+                    args=[team_name, bucket_name, team_id],
                     start_to_close_timeout=timedelta(seconds=30)
                 )
         else:
@@ -0,0 +1,31 @@
+from temporalio import workflow
+from temporalio.common import RetryPolicy
+from datetime import timedelta
+
+@workflow.defn
+class NotificationRetentionWorkflow:
+    @workflow.run
+    async def run(self, retention_days: int, batch_size: int, max_batches: int):
+        # workflow.now is deterministic across replays
+        cutoff = (workflow.now() - timedelta(days=retention_days)).replace(tzinfo=None)
+
+        archived = 0
+        while True:
+            result = await workflow.execute_activity(
+                "archive_notifications",
+                args=[cutoff.isoformat(), batch_size, max_batches],
+                start_to_close_timeout=timedelta(minutes=30),
+                heartbeat_timeout=timedelta(minutes=2),
+                retry_policy=RetryPolicy(maximum_attempts=5),
+            )
+            archived += result["archived"]
+            # A partial run means everything older than the cutoff has been archived
+            if result["batches"] < max_batches:
+                break
+
+        freed_pages = await workflow.execute_activity(
+            "vacuum_notifications",
+            start_to_close_timeout=timedelta(minutes=30),
+        )
+        workflow.logger.info(f"Archived {archived} notifications, freed {freed_pages} pages")
+        return {"archived": archived, "freed_pages": freed_pages}
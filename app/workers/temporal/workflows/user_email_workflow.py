@@ -1,25 +1,68 @@
 from temporalio import workflow
 from datetime import timedelta
+from typing import Callable, List
+import asyncio
+
+async def run_chunks(activity_name: str, chunks: List[list], chunk_args: Callable[[list], list], max_concurrency: int) -> List[dict]:
+    """ Run the activity once per chunk, at most max_concurrency at a time, and merge the per recipient results """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def send_chunk(chunk: list) -> List[dict]:
+        async with semaphore:
+            return await workflow.execute_activity(
+                activity_name,
+                args=chunk_args(chunk),
+                start_to_close_timeout=timedelta(minutes=5)
+            )
+
+    return [result for results in await asyncio.gather(*[send_chunk(chunk) for chunk in chunks]) for result in results]
+
+def log_failures(results: List[dict]):
+    failed = [result["email"] for result in results if not result["sent"]]
+    if failed:
+        workflow.logger.warning(f"Failed to send {len(failed)} of {len(results)} emails")
 
 @workflow.defn
 class UserEmailWorkflow:
     @workflow.run
-    async def run(self, email_addresses_str: str, subject: str, html_content: str):
+    async def run(self, email_addresses_str: str, subject: str, html_content: str, batch_size: int = 100, max_concurrency: int = 4):
         try:
             # convert email addresses back to a list
             email_addresses = email_addresses_str.split(',')
 
-            results = []
-            for email_address in email_addresses:
-                result = await workflow.execute_activity(
-                    "handle_email_workflow",
-                    args=[email_address, subject, html_content],
-                    start_to_close_timeout=timedelta(seconds=30)
-                )
-                if result:
-                    results.append(result)
-
-            return results if results else ["No emails sent"]
+            # Workflows started before batching replay the one activity per email delivery
+            if not workflow.patched("batched-email-delivery"):
+                return await self.send_one_by_one(email_addresses, subject, html_content)
+
+            chunks = [email_addresses[start:start + batch_size] for start in range(0, len(email_addresses), batch_size)]
+            results = await run_chunks("send_emails", chunks, lambda chunk: [chunk, subject, html_content], max_concurrency)
+            log_failures(results)
+            return results
         except Exception as e:
             workflow.logger.error(f"Workflow failed: {e}")
             raise
+
+    async def send_one_by_one(self, email_addresses: List[str], subject: str, html_content: str):
+        results = []
+        for email_address in email_addresses:
+            result = await workflow.execute_activity(
+                "handle_email_workflow",
+                args=[email_address, subject, html_content],
+                start_to_close_timeout=timedelta(seconds=30)
+            )
+            if result:
+                results.append(result)
+
+        return results if results else ["No emails sent"]
+
+@workflow.defn
+class BatchEmailWorkflow:
+    @workflow.run
+    async def run(self, template_name: str, subject: str, context: dict, recipients: List[dict], batch_size: int = 100, max_concurrency: int = 4):
+        # Send the recipients in batches so a failed batch only retries its own emails
+        chunks = [recipients[start:start + batch_size] for start in range(0, len(recipients), batch_size)]
+        results = await run_chunks(
+            "send_batch_emails", chunks, lambda chunk: [template_name, subject, context, chunk], max_concurrency
+        )
+        log_failures(results)
+        return results
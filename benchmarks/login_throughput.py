@@ -0,0 +1,112 @@
+"""
+Benchmark of concurrent login throughput with bcrypt inline and on the bounded hashing executor.
+
+Runs the login endpoint in process against a throwaway sqlite database. While the
+logins run, the event loop lag is sampled to show how long other requests would wait.
+
+    python -m benchmarks.login_throughput --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from app.api.v1.endpoints.auth import auth_router
+from app.db import models
+from app.db.session import create_async_database_engine, get_db
+from app.services import hashing_service
+
+class InlineExecutor(hashing_service.BoundedExecutor):
+    """ Runs bcrypt on the event loop, the way the endpoints did before the executor """
+
+    def __init__(self):
+        super().__init__("inline", workers=1, max_queue=0)
+
+    async def run(self, func, *args):
+        return func(*args)
+
+def create_app(session_factory) -> FastAPI:
+    app = FastAPI()
+
+    async def get_benchmark_db():
+        async with session_factory() as db:
+            yield db
+
+    app.include_router(auth_router, prefix="/v1/auth")
+    app.dependency_overrides[get_db] = get_benchmark_db
+    return app
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    credentials = {"username": "benchmark@example.com", "password": "benchmark"}
+    remaining = iter(range(requests))
+    statuses = {}
+    loop_lags = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.post("/v1/auth/login", data=credentials)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def sample_loop_lag():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                loop_lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+        sampler = asyncio.create_task(sample_loop_lag())
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+    loop_lags.sort()
+    return {
+        "logins/s": statuses.get(200, 0) / elapsed,
+        "statuses": statuses,
+        "lag p50 ms": statistics.median(loop_lags),
+        "lag max ms": loop_lags[-1],
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "login_throughput.db")
+    engine = create_async_database_engine(f"sqlite:///{path}")
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    async with session_factory() as db:
+        db.add(models.User(name="benchmark", email="benchmark@example.com", password=hashing_service.bcrypt_hash("benchmark"), is_active=True))
+        await db.commit()
+
+    app = create_app(session_factory)
+    executors = {
+        "inline": InlineExecutor(),
+        f"thread x{args.workers}": hashing_service.BoundedExecutor("thread", args.workers, args.max_queue),
+        f"process x{args.workers}": hashing_service.BoundedExecutor("process", args.workers, args.max_queue),
+        f"thread x{args.workers}, queue 0": hashing_service.BoundedExecutor("thread", args.workers, 0),
+    }
+    for name, executor in executors.items():
+        hashing_service.hashing_executor = executor
+        # Warm up the pool so process start up isn't measured
+        await run(app, args.workers, args.workers)
+        result = await run(app, args.requests, args.concurrency)
+        executor.shutdown()
+        print(f"{name:<22} {result['logins/s']:7.1f} logins/s  statuses={result['statuses']}  "
+              f"loop lag p50={result['lag p50 ms']:.1f}ms max={result['lag max ms']:.1f}ms")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Benchmark of the composite lookup indexes on memberships, invitations and notifications.
+
+Seeds a throwaway sqlite database, then prints the query plan and latency of the
+hot lookups before and after the indexes declared in app/db/models.py are created.
+
+    python -m benchmarks.lookup_indexes --memberships 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from app.db import models
+
+# The lookups which are run on nearly every request
+LOOKUPS = {
+    "membership": "SELECT id, role FROM memberships WHERE user_id = :user_id AND team_id = :team_id",
+    "invitation": "SELECT id FROM invitations WHERE team_id = :team_id AND invited_user_email = :email",
+    "notifications": (
+        "SELECT id, message FROM notifications WHERE user_id = :user_id OR team_id = :team_id "
+        "ORDER BY created_at DESC LIMIT 50"
+    ),
+}
+
+# Composite indexes under test, the remaining indexes are part of the baseline
+COMPOSITE_INDEXES = [
+    index
+    for table in (models.Membership.__table__, models.Invitations.__table__, models.Notifications.__table__)
+    for index in table.indexes
+    if len(index.columns) > 1
+]
+
+TEAM_SIZE = 20
+
+def seed(connection, memberships: int):
+    users = max(memberships // 5, TEAM_SIZE + 1)
+    teams = memberships // TEAM_SIZE + 1
+    start = datetime(2025, 1, 1)
+
+    # Every team gets TEAM_SIZE distinct users so (user_id, team_id) stays unique
+    connection.exec_driver_sql(
+        "INSERT INTO memberships (user_id, team_id, role) VALUES (?, ?, ?)",
+        [((i * 7919) % users + 1, i // TEAM_SIZE + 1, "VIEWER") for i in range(memberships)],
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO invitations (team_id, invited_user_email) VALUES (?, ?)",
+        [(i // TEAM_SIZE + 1, f"user{i}@example.com") for i in range(memberships // 5)],
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO notifications (user_id, team_id, message, created_at) VALUES (?, ?, ?, ?)",
+        [
+            (random.randint(1, users), None, "user notification", start + timedelta(seconds=i))
+            if i % 2 else
+            (None, random.randint(1, teams), "team notification", start + timedelta(seconds=i))
+            for i in range(memberships)
+        ],
+    )
+    return users, teams
+
+def random_params(users: int, teams: int, memberships: int) -> dict:
+    i = random.randrange(memberships // 5)
+    return {
+        "user_id": random.randint(1, users),
+        "team_id": i // TEAM_SIZE + 1,
+        "email": f"user{i}@example.com",
+    }
+
+def measure(connection, query: str, samples: list) -> dict:
+    timings = []
+    for params in samples:
+        started = time.perf_counter()
+        connection.execute(text(query), params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "max": timings[-1],
+    }
+
+def report(connection, label: str, samples: list):
+    print(f"\n=== {label}")
+    for name, query in LOOKUPS.items():
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {query}"), samples[0]).fetchall()
+        timings = measure(connection, query, samples)
+        print(f"\n[{name}] p50={timings['p50']:.3f}ms p95={timings['p95']:.3f}ms max={timings['max']:.3f}ms")
+        for row in plan:
+            print(f"    {row[-1]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memberships", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    path = os.path.join(tempfile.mkdtemp(), "lookup_indexes.db")
+    engine = create_engine(f"sqlite:///{path}")
+
+    with engine.begin() as connection:
+        models.Base.metadata.create_all(connection)
+        for index in COMPOSITE_INDEXES:
+            index.drop(connection)
+
+        started = time.perf_counter()
+        users, teams = seed(connection, args.memberships)
+        print(f"Seeded {args.memberships} memberships in {time.perf_counter() - started:.1f}s ({path})")
+        connection.exec_driver_sql("ANALYZE")
+
+    samples = [random_params(users, teams, args.memberships) for _ in range(args.queries)]
+
+    with engine.connect() as connection:
+        report(connection, "Before: primary key indexes only", samples)
+
+    with engine.begin() as connection:
+        started = time.perf_counter()
+        for index in COMPOSITE_INDEXES:
+            index.create(connection)
+        connection.exec_driver_sql("ANALYZE")
+        print(f"\nCreated {len(COMPOSITE_INDEXES)} composite indexes in {time.perf_counter() - started:.1f}s")
+
+    with engine.connect() as connection:
+        report(connection, "After: composite lookup indexes", samples)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of end-to-end notification latency in the workflow and direct dispatch modes.
+
+Dispatches notifications against a throwaway sqlite database and measures the time from
+dispatch until a redis subscriber receives the message, along with how long the dispatch
+call itself takes. Redis is replaced by fakeredis. The workflow mode runs an in process
+notification worker and needs a temporal server at TEMPORAL_URL, it's skipped otherwise.
+
+    python -m benchmarks.notification_latency --notifications 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+import fakeredis
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from temporalio.worker import Worker
+from app.core.config import get_settings
+from app.db import models
+from app.db.session import create_async_database_engine
+from app.services import notification_service, temporal_service
+from app.workers.temporal.activities import app_notifications_activity
+from app.workers.temporal.workflows.app_notifications_workflow import AppNotificationsWorkflow
+
+def percentiles(timings: list) -> str:
+    timings = sorted(timings)
+    return (f"p50={statistics.median(timings):7.2f}ms p95={timings[int(len(timings) * 0.95) - 1]:7.2f}ms "
+            f"max={timings[-1]:7.2f}ms")
+
+async def measure(redis_client, notifications: int) -> dict:
+    topic = f"benchmark-{uuid.uuid4().hex}"
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(topic)
+    await pubsub.get_message(timeout=1)
+
+    dispatch_timings = []
+    delivery_timings = []
+    for i in range(notifications):
+        started = time.perf_counter()
+        await notification_service.start_app_notifications_workflow([{"user_id": topic}], f"notification {i}")
+        dispatch_timings.append((time.perf_counter() - started) * 1000)
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30)
+            if message is None:
+                raise TimeoutError(f"Notification {i} was not delivered")
+            if message["data"] == f"notification {i}":
+                break
+        delivery_timings.append((time.perf_counter() - started) * 1000)
+
+    await pubsub.unsubscribe(topic)
+    await pubsub.aclose()
+    return {"dispatch": dispatch_timings, "delivery": delivery_timings}
+
+def report(mode: str, timings: dict):
+    print(f"\n=== {mode}")
+    print(f"dispatch call  {percentiles(timings['dispatch'])}")
+    print(f"end to end     {percentiles(timings['delivery'])}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "notification_latency.db")
+    engine = create_async_database_engine(f"sqlite:///{path}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    notification_service.AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    notification_service.redis_client = redis_client
+    app_notifications_activity.redis_client = redis_client
+    settings = get_settings()
+
+    settings.NOTIFICATION_DISPATCH_MODE = "direct"
+    report("direct", await measure(redis_client, args.notifications))
+
+    try:
+        client = await asyncio.wait_for(temporal_service.get_temporal_client(), timeout=5)
+    except Exception as e:
+        print(f"\n=== workflow\nskipped, no temporal server at {settings.TEMPORAL_URL}: {e}")
+    else:
+        settings.NOTIFICATION_DISPATCH_MODE = "workflow"
+        async with Worker(
+            client, task_queue="app-notification-task-queue",
+            workflows=[AppNotificationsWorkflow],
+            activities=[
+                app_notifications_activity.send_app_notifications_to_user,
+                app_notifications_activity.send_app_notifications_batch
+            ]
+        ):
+            report("workflow", await measure(redis_client, args.notifications))
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
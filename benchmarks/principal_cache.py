@@ -0,0 +1,86 @@
+"""
+Benchmark of authenticated requests/sec with and without the principal cache.
+
+Runs an endpoint depending on get_current_user in process against a throwaway
+sqlite database, with the redis tier of the cache replaced by fakeredis.
+
+    python -m benchmarks.principal_cache --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import fakeredis
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from app.db import models
+from app.db.session import create_async_database_engine, get_db
+from app.services import auth_service
+
+def create_app(session_factory) -> FastAPI:
+    app = FastAPI()
+
+    async def get_benchmark_db():
+        async with session_factory() as db:
+            yield db
+
+    @app.get("/me")
+    async def me(current_user = Depends(auth_service.get_current_user)):
+        return {"id": current_user.id}
+
+    app.dependency_overrides[get_db] = get_benchmark_db
+    return app
+
+async def run(app: FastAPI, token: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/me", headers=headers)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return requests / (time.perf_counter() - started)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "principal_cache.db")
+    engine = create_async_database_engine(f"sqlite:///{path}")
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    async with session_factory() as db:
+        user = models.User(name="benchmark", email="benchmark@example.com", password="unused", is_active=True)
+        db.add(user)
+        await db.commit()
+
+    token = auth_service.create_access_token(data={"user_id": user.id})
+    app = create_app(session_factory)
+    cache = auth_service.principal_cache or auth_service.TwoLevelCache("principal", 60, 10, 10000)
+    cache.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    # Warm up the connection pool before measuring
+    auth_service.principal_cache = None
+    await run(app, token, args.concurrency, args.concurrency)
+
+    without_cache = await run(app, token, args.requests, args.concurrency)
+    print(f"without cache: {without_cache:8.0f} req/s")
+
+    auth_service.principal_cache = cache
+    with_cache = await run(app, token, args.requests, args.concurrency)
+    print(f"with cache:    {with_cache:8.0f} req/s  ({with_cache / without_cache:.1f}x) {cache.stats()}")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
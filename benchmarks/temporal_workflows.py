@@ -0,0 +1,257 @@
+"""
+Benchmark of the temporal workflows of each task queue.
+
+Runs the notification, email and bucket creation workflows against an in process time skipping
+test server, with workers configured from the same <QUEUE>_WORKER_* settings as run_worker.
+Redis is replaced by fakeredis, smtp by a local aiosmtpd server, minio by an in memory fake and
+the database by a throwaway sqlite file. Prints workflows/sec and activity latency percentiles
+per queue, and the memory held per bucket workflow waiting on approval.
+
+The test server binary isn't shipped with temporalio: WorkflowEnvironment.start_time_skipping downloads
+it into the system temp directory on first use, so the first run needs network access. Pass --test-server
+with the path of an already downloaded binary to run offline. fakeredis and aiosmtpd come from the dev
+dependencies (poetry install --with dev).
+
+Worker limits and email batching are read from the environment, so changes can be compared
+by running it again with e.g. EMAIL_WORKER_MAX_ACTIVITIES or EMAIL_BATCH_SIZE set.
+
+    python -m benchmarks.temporal_workflows --workflows 100 --topics 50 --recipients 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+import fakeredis
+from aiosmtpd.controller import Controller
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from temporalio import activity
+from temporalio.testing import WorkflowEnvironment
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+from app.core.config import get_settings
+from app.db import models
+from app.db.session import create_async_database_engine
+from app.services import minio_service, notification_service, temporal_service
+from app.services.mail import mail_service
+from app.services.mail.smtp_service import SMTPConnectionPool
+from app.workers.temporal.activities import (
+    app_notifications_activity, create_bucket_activity, user_email_activity
+)
+from app.workers.temporal.worker_manager import create_worker, get_worker_limits
+from app.workers.temporal.workflows.app_notifications_workflow import AppNotificationsWorkflow
+from app.workers.temporal.workflows.user_email_workflow import UserEmailWorkflow, BatchEmailWorkflow
+from app.workers.temporal.workflows.create_bucket_workflow import BucketCreationWorkFlow
+
+class ActivityTimings(Interceptor):
+    """ Records how long every activity takes, by activity type """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return TimedActivityInbound(next, self.timings)
+
+class TimedActivityInbound(ActivityInboundInterceptor):
+    def __init__(self, next: ActivityInboundInterceptor, timings: defaultdict):
+        super().__init__(next)
+        self.timings = timings
+
+    async def execute_activity(self, input: ExecuteActivityInput):
+        started = time.perf_counter()
+        try:
+            return await super().execute_activity(input)
+        finally:
+            self.timings[activity.info().activity_type].append((time.perf_counter() - started) * 1000)
+
+class SMTPSink:
+    """ aiosmtpd handler which accepts and counts every message """
+
+    def __init__(self):
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return "250 OK"
+
+class FakeMinio:
+    """ In memory stand in for the minio client """
+    buckets = set()
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return bucket_name in self.buckets
+
+    def make_bucket(self, bucket_name: str):
+        self.buckets.add(bucket_name)
+
+def percentiles(timings: list) -> str:
+    timings = sorted(timings)
+    return (f"p50={statistics.median(timings):7.2f}ms p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:7.2f}ms "
+            f"max={timings[-1]:7.2f}ms")
+
+def report(queue: str, workflows: int, elapsed: float, timings: ActivityTimings, extra: str = ""):
+    print(f"\n=== {queue}: {workflows} workflows in {elapsed:.2f}s, {workflows / elapsed:.1f} workflows/s {extra}")
+    for activity_type, activity_timings in sorted(timings.timings.items()):
+        print(f"    {activity_type:32} n={len(activity_timings):<6} {percentiles(activity_timings)}")
+    timings.timings.clear()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_notifications(client, workflows: int, topics: int):
+    settings = get_settings()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client.execute_workflow(
+            AppNotificationsWorkflow.run,
+            args=[
+                ",".join(f"benchmark-{i}-{topic}" for topic in range(topics)), f"notification {i}",
+                settings.NOTIFICATION_FANOUT_CHUNK_SIZE, settings.NOTIFICATION_FANOUT_CONCURRENCY
+            ],
+            id=f"notification-{uuid.uuid4().hex}",
+            task_queue="app-notification-task-queue"
+        )
+        for i in range(workflows)
+    ])
+    return time.perf_counter() - started
+
+async def run_emails(client, workflows: int, recipients: int):
+    settings = get_settings()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client.execute_workflow(
+            BatchEmailWorkflow.run,
+            args=[
+                "invitation_mail.html", "Invitation", {"team_name": "benchmark"},
+                [
+                    {"email": f"user{i}-{j}@example.com", "user_email": f"user{i}-{j}@example.com",
+                     "username": f"user{j}", "invitation_link": f"https://example.com/{i}/{j}"}
+                    for j in range(recipients)
+                ],
+                settings.EMAIL_BATCH_SIZE, settings.EMAIL_CONCURRENCY
+            ],
+            id=f"batch-email-{uuid.uuid4().hex}",
+            task_queue="user-email-task-queue"
+        )
+        for i in range(workflows)
+    ])
+    return time.perf_counter() - started
+
+async def run_buckets(client, workflows: int):
+    """ Starts every workflow and waits for them all to block on approval before approving them """
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    handles = await asyncio.gather(*[
+        client.start_workflow(
+            BucketCreationWorkFlow.create_new_bucket,
+            args=[f"bucket-{i}", "benchmark", 1],
+            id=f"bucket-{uuid.uuid4().hex}",
+            task_queue="bucket-creation-task-queue"
+        )
+        for i in range(workflows)
+    ])
+
+    # A workflow is waiting once its first workflow task completed, recording the expiry patch marker
+    # and starting the approval timer
+    for handle in handles:
+        while (await handle.describe()).history_length < 6:
+            await asyncio.sleep(0.01)
+    waiting, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await asyncio.gather(*[handle.signal(BucketCreationWorkFlow.admin_approval, True) for handle in handles])
+    results = await asyncio.gather(*[handle.result() for handle in handles])
+    failed = [result for result in results if not result["success"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} buckets weren't created: {failed[0]['message']}")
+    return time.perf_counter() - started, (waiting - baseline) / workflows
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workflows", type=int, default=100, help="workflows started per queue")
+    parser.add_argument("--topics", type=int, default=50, help="topics per notification workflow")
+    parser.add_argument("--recipients", type=int, default=200, help="recipients per email workflow")
+    parser.add_argument("--test-server", help="path of the temporal test server binary, downloaded if not given")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "temporal_workflows.db")
+    engine = create_async_database_engine(f"sqlite:///{path}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    notification_service.AsyncSessionLocal = session_factory
+    create_bucket_activity.AsyncSessionLocal = session_factory
+
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    notification_service.redis_client = redis_client
+    app_notifications_activity.redis_client = redis_client
+
+    smtp_sink = SMTPSink()
+    smtp_port = free_port()
+    smtp_server = Controller(smtp_sink, hostname="127.0.0.1", port=smtp_port)
+    smtp_server.start()
+    user_email_activity.smtp_pool = SMTPConnectionPool(
+        mail_service.mail_configuation.model_copy(update={
+            "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": smtp_port,
+            "MAIL_SSL_TLS": False, "MAIL_STARTTLS": False, "USE_CREDENTIALS": False
+        }),
+        size=get_settings().EMAIL_SMTP_POOL_SIZE
+    )
+
+    minio_service.create_minio_client = lambda credentials: FakeMinio()
+    create_bucket_activity.get_secret = lambda path: json.dumps({
+        "minio_server": "minio", "minio_access_key": "key", "minio_secret_key": "secret"
+    })
+
+    try:
+        env = await WorkflowEnvironment.start_time_skipping(test_server_existing_path=args.test_server)
+    except Exception as e:
+        print(f"Couldn't start the time skipping test server, it's downloaded unless --test-server is given: {e}")
+        smtp_server.stop()
+        return
+
+    # The bucket activity notifies the team through the same client
+    temporal_service.set_temporal_client(env.client)
+    timings = ActivityTimings()
+    queues = [
+        ("notification", "app-notification-task-queue", [AppNotificationsWorkflow],
+         [app_notifications_activity.send_app_notifications_to_user, app_notifications_activity.send_app_notifications_batch]),
+        ("email", "user-email-task-queue", [UserEmailWorkflow, BatchEmailWorkflow],
+         [user_email_activity.handle_email_workflow, user_email_activity.send_emails, user_email_activity.send_batch_emails]),
+        ("bucket", "bucket-creation-task-queue", [BucketCreationWorkFlow],
+         [create_bucket_activity.create_bucket, create_bucket_activity.expire_bucket_request]),
+    ]
+
+    async with env, AsyncExitStack() as stack:
+        for queue, task_queue, workflows, activities in queues:
+            activity_executor = stack.enter_context(ThreadPoolExecutor(max_workers=get_worker_limits(queue).activity_threads))
+            await stack.enter_async_context(create_worker(
+                env.client, queue, task_queue, workflows, activities, activity_executor, interceptors=[timings]
+            ))
+
+        elapsed = await run_notifications(env.client, args.workflows, args.topics)
+        report("notification", args.workflows, elapsed, timings, f"({args.workflows * args.topics / elapsed:.0f} topics/s)")
+
+        elapsed = await run_emails(env.client, args.workflows, args.recipients)
+        report("email", args.workflows, elapsed, timings, f"({smtp_sink.messages / elapsed:.0f} emails/s, {smtp_sink.messages} delivered)")
+
+        # Creating a bucket also notifies the team, so notification activities show up here as well
+        elapsed, memory_per_workflow = await run_buckets(env.client, args.workflows)
+        report("bucket", args.workflows, elapsed, timings, f"({memory_per_workflow / 1024:.1f} KiB per waiting workflow)")
+
+    await user_email_activity.smtp_pool.close()
+    smtp_server.stop()
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
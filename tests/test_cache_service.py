@@ -0,0 +1,62 @@
+import asyncio
+import fakeredis
+from app.services.cache_service import TwoLevelCache
+
+def create_cache(redis_client) -> TwoLevelCache:
+    return TwoLevelCache("role", ttl=300, local_ttl=30, local_maxsize=100, redis_client=redis_client)
+
+async def read_with_invalidation(reader: TwoLevelCache, invalidator: TwoLevelCache):
+    """ Fill the reader's cache the way get_user_role does, with the role changed while it's read from the database """
+    generation = await reader.generation("1:1")
+
+    # The membership is read as admin, then demoted and invalidated before the read is cached
+    role = {"role": "admin", "team_name": "team"}
+    await invalidator.delete("1:1")
+
+    await reader.set("1:1", role, generation=generation)
+
+def test_invalidation_during_read_in_the_same_process():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    cache = create_cache(redis_client)
+
+    async def run():
+        await read_with_invalidation(cache, cache)
+        assert cache.local.get("1:1") is None
+        assert await redis_client.get(cache.redis_key("1:1")) is None
+        assert await cache.get("1:1") is None
+
+    asyncio.run(run())
+
+def test_invalidation_during_read_in_another_process():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    reader, invalidator = create_cache(redis_client), create_cache(redis_client)
+
+    async def run():
+        await read_with_invalidation(reader, invalidator)
+        assert await redis_client.get(reader.redis_key("1:1")) is None
+        assert await invalidator.get("1:1") is None
+
+    asyncio.run(run())
+
+def test_read_without_invalidation_is_cached():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    reader, other = create_cache(redis_client), create_cache(redis_client)
+
+    async def run():
+        # An earlier invalidation doesn't keep later reads from being cached
+        await other.delete("1:1")
+        generation = await reader.generation("1:1")
+        await reader.set("1:1", {"role": "member", "team_name": "team"}, generation=generation)
+        assert reader.local.get("1:1") == {"role": "member", "team_name": "team"}
+        assert await other.get("1:1") == {"role": "member", "team_name": "team"}
+
+    asyncio.run(run())
+
+def test_invalidation_during_read_without_redis():
+    cache = create_cache(None)
+
+    async def run():
+        await read_with_invalidation(cache, cache)
+        assert await cache.get("1:1") is None
+
+    asyncio.run(run())